@@ -3,15 +3,41 @@
 """
 Camera Controller Module
 Manages USB camera capture and pan/tilt servo control for Raspbot V2
+(CSI cameras through picamera2 are supported as an optional backend)
 """
 
 import cv2
+import io
 import threading
 import time
 import numpy as np
 from typing import Optional, Tuple
 from Raspbot_Lib import Raspbot
 
+# Optional: libcamera backend for CSI cameras, with an encoder that produces
+# JPEGs for the web stream without going through OpenCV
+try:
+    from picamera2 import Picamera2, MappedArray
+    from picamera2.encoders import MJPEGEncoder, Quality
+    from picamera2.outputs import FileOutput
+except ImportError:
+    Picamera2 = None
+
+
+class _JpegSink(io.BufferedIOBase):
+    """File-like output for picamera2's MJPEGEncoder; each write is one JPEG"""
+    
+    def __init__(self, camera: 'CameraController'):
+        super().__init__()
+        self.camera = camera
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, buf) -> int:
+        self.camera._publish_jpeg(bytes(buf))
+        return len(buf)
+
 
 class CameraController:
     """
@@ -19,6 +45,7 @@ class CameraController:
     
     Features:
     - USB camera capture with configurable resolution and FPS
+    - Optional picamera2 backend for CSI cameras, with camera-encoded JPEGs
     - Thread-safe frame access
     - Pan/tilt servo control for camera tracking
     - Automatic reconnection on camera failure
@@ -30,7 +57,8 @@ class CameraController:
                  width: int = 640,
                  height: int = 480,
                  fps: int = 30,
-                 enable_servos: bool = True):
+                 enable_servos: bool = True,
+                 backend: str = 'opencv'):
         """
         Initialize camera controller
         
@@ -40,20 +68,36 @@ class CameraController:
             height: Frame height in pixels
             fps: Target frames per second
             enable_servos: Enable servo control
+            backend: 'opencv' (USB cameras) or 'picamera2' (CSI cameras)
         """
         self.camera_id = camera_id
         self.width = width
         self.height = height
         self.fps = fps
         self.enable_servos = enable_servos
+        self.backend = backend
         
         # Camera capture
         self.cap = None
+        self.picam2 = None
         self.is_opened = False
         
+        # Camera-encoded JPEG stream, see start_jpeg_stream
+        self._jpeg_encoder = None  # picamera2 MJPEGEncoder
+        self._mjpeg_wanted = False  # USB: pass the camera's MJPEG through undecoded
+        self._mjpeg_passthrough = False
+        self._mjpeg_unsupported = False
+        self._pending_jpeg = None  # Newest undecoded JPEG while passing through
+        self.latest_jpeg = (None, 0)  # (JPEG data, sequence number)
+        self.jpeg_cond = threading.Condition()
+        
         # Frame storage
         self.current_frame = None
         self.frame_lock = threading.Lock()
+        # Notified (under frame_lock) whenever a new frame is stored, see wait_new
+        self.frame_cond = threading.Condition(self.frame_lock)
+        # Spare buffer the capture thread decodes into; swapped with current_frame
+        self._back_buffer = None
         
         # Capture thread
         self.capture_thread = None
@@ -85,6 +129,9 @@ class CameraController:
         Returns:
             True if successful, False otherwise
         """
+        if self.backend == 'picamera2':
+            return self._open_picamera2()
+        
         try:
             self.cap = cv2.VideoCapture(self.camera_id)
             
@@ -96,6 +143,8 @@ class CameraController:
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
             self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+            # Keep only the newest frame in the driver queue so reads never lag behind
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
             # Verify actual settings
             actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -111,6 +160,124 @@ class CameraController:
             print(f"Error opening camera: {e}")
             return False
     
+    def _open_picamera2(self) -> bool:
+        """Open a CSI camera through picamera2"""
+        if Picamera2 is None:
+            print("Error: picamera2 is not installed (sudo apt install python3-picamera2)")
+            return False
+        
+        try:
+            self.picam2 = Picamera2(self.camera_id)
+            # 'RGB888' is laid out B, G, R in memory, i.e. OpenCV's BGR
+            config = self.picam2.create_video_configuration(
+                main={'size': (self.width, self.height), 'format': 'RGB888'},
+                controls={'FrameRate': self.fps}
+            )
+            self.picam2.configure(config)
+            self.picam2.start()
+            
+            print(f"Camera opened (picamera2): {self.width}x{self.height} @ {self.fps}fps")
+            
+            self.is_opened = True
+            return True
+            
+        except Exception as e:
+            print(f"Error opening camera: {e}")
+            self.picam2 = None
+            return False
+    
+    def start_jpeg_stream(self) -> bool:
+        """
+        Have the camera pipeline encode JPEGs itself (picamera2 only)
+        
+        The frames are the raw camera image without annotations; read them
+        with wait_jpeg. USB cameras pass their own MJPEG through (no decode
+        until a frame is actually read), picamera2 runs an MJPEGEncoder.
+        
+        Returns:
+            True if the stream is running
+        """
+        if self._jpeg_encoder is not None:
+            return True
+        
+        if self.cap is not None:
+            # The capture thread switches the format between reads
+            if self._mjpeg_unsupported:
+                return False
+            self._mjpeg_wanted = True
+            return True
+        
+        if self.picam2 is None:
+            return False
+        
+        try:
+            encoder = MJPEGEncoder()
+            self.picam2.start_encoder(encoder, FileOutput(_JpegSink(self)), quality=Quality.HIGH)
+            self._jpeg_encoder = encoder
+            return True
+        except Exception as e:
+            print(f"Warning: Could not start camera JPEG encoder: {e}")
+            return False
+    
+    def stop_jpeg_stream(self):
+        """Stop the camera-encoded JPEG stream, if running"""
+        self._mjpeg_wanted = False
+        if self._jpeg_encoder is None:
+            return
+        
+        try:
+            self.picam2.stop_encoder(self._jpeg_encoder)
+        except Exception as e:
+            print(f"Warning: Could not stop camera JPEG encoder: {e}")
+        self._jpeg_encoder = None
+    
+    def _set_mjpeg_passthrough(self, enable: bool):
+        """Switch a USB camera between decoded frames and raw MJPEG (capture thread only)"""
+        if enable:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+            if fourcc != cv2.VideoWriter_fourcc(*'MJPG') or \
+                    not self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+                print("Warning: Camera can't stream MJPEG, JPEG pass-through disabled")
+                self._mjpeg_unsupported = True
+                self._mjpeg_wanted = False
+                return
+        else:
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        
+        self._mjpeg_passthrough = enable
+    
+    def _latest_frame(self) -> Optional[np.ndarray]:
+        """Current frame, decoding a passed-through JPEG first if needed (frame_lock held)"""
+        if self._pending_jpeg is not None:
+            self.current_frame = cv2.imdecode(self._pending_jpeg, cv2.IMREAD_COLOR)
+            self._pending_jpeg = None
+        return self.current_frame
+    
+    def _publish_jpeg(self, jpeg):
+        """Store a camera-encoded JPEG and wake wait_jpeg callers"""
+        with self.jpeg_cond:
+            self.latest_jpeg = (jpeg, self.latest_jpeg[1] + 1)
+            self.jpeg_cond.notify_all()
+    
+    def wait_jpeg(self, last_seq: int, timeout: Optional[float] = 1.0) -> Tuple[int, Optional[memoryview]]:
+        """
+        Block until the camera-encoded stream has a JPEG newer than last_seq
+        
+        Args:
+            last_seq: Sequence number returned by the previous call (0 initially)
+            timeout: Maximum seconds to wait (None waits forever)
+        
+        Returns:
+            Tuple of (sequence number, JPEG data); the data (bytes or a
+            memoryview) is None on timeout
+        """
+        with self.jpeg_cond:
+            if not self.jpeg_cond.wait_for(lambda: self.latest_jpeg[1] != last_seq, timeout=timeout):
+                return last_seq, None
+            jpeg, seq = self.latest_jpeg
+            return seq, jpeg
+    
     def close(self):
         """Close camera and cleanup resources"""
         self.stop_capture()
@@ -119,6 +286,12 @@ class CameraController:
             self.cap.release()
             self.cap = None
         
+        if self.picam2 is not None:
+            self.stop_jpeg_stream()
+            self.picam2.stop()
+            self.picam2.close()
+            self.picam2 = None
+        
         self.is_opened = False
         print("Camera closed")
     
@@ -155,22 +328,46 @@ class CameraController:
         """Background thread for continuous frame capture"""
         while self.running:
             try:
-                ret, frame = self.cap.read()
+                if self.cap is not None and self._mjpeg_wanted != self._mjpeg_passthrough:
+                    self._set_mjpeg_passthrough(self._mjpeg_wanted)
+                
+                if self.picam2 is not None:
+                    frame = self._capture_picamera2()
+                    ret = True
+                elif self._mjpeg_passthrough:
+                    # With CONVERT_RGB off, read() returns the camera's JPEG
+                    # as a flat byte buffer; it is only decoded if someone reads it
+                    ret, frame = self.cap.read()
+                    if ret:
+                        self._publish_jpeg(frame.reshape(-1).data)  # No copy: read() allocated it
+                else:
+                    # Decode into the spare buffer instead of a fresh allocation;
+                    # readers only copy current_frame under the lock, so the
+                    # previous frame is free to be reused once it is swapped out
+                    ret, frame = self.cap.read(self._back_buffer)
                 
                 if ret:
                     with self.frame_lock:
-                        self.current_frame = frame
+                        if self._mjpeg_passthrough:
+                            self._pending_jpeg = frame
+                        else:
+                            self._pending_jpeg = None
+                            self._back_buffer = self.current_frame
+                            self.current_frame = frame
                         self.frame_count += 1
+                        self.frame_cond.notify_all()
                 else:
                     self.dropped_frames += 1
                     print(f"Warning: Failed to capture frame (dropped: {self.dropped_frames})")
                     
                     # Try to reconnect
-                    if self.dropped_frames > 10:
+                    if self.dropped_frames > 10 and self.cap is not None:
                         print("Attempting to reconnect camera...")
                         self.cap.release()
                         time.sleep(1)
                         self.cap = cv2.VideoCapture(self.camera_id)
+                        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                        self._mjpeg_passthrough = False  # Re-applied next iteration if wanted
                         self.dropped_frames = 0
                 
                 # Small delay to prevent CPU spinning
@@ -180,6 +377,27 @@ class CameraController:
                 print(f"Error in capture loop: {e}")
                 time.sleep(0.1)
     
+    def _capture_picamera2(self) -> np.ndarray:
+        """
+        Capture one picamera2 frame into the spare buffer
+        
+        The frame is copied once, straight out of the mapped DMA buffer
+        (capture_array would allocate a new array per frame), and the request
+        goes back to libcamera right away so capture never waits on readers.
+        
+        Returns:
+            The filled spare buffer
+        """
+        with self.picam2.captured_request() as request:
+            with MappedArray(request, 'main') as mapped:
+                # Drop any stride padding past the configured width
+                image = mapped.array[:, :self.width]
+                frame = self._back_buffer
+                if frame is None or frame.shape != image.shape:
+                    frame = np.empty(image.shape, np.uint8)
+                np.copyto(frame, image)
+        return frame
+    
     def read_frame(self) -> Optional[np.ndarray]:
         """
         Get the current frame (thread-safe)
@@ -188,8 +406,9 @@ class CameraController:
             Current frame or None if not available
         """
         with self.frame_lock:
-            if self.current_frame is not None:
-                return self.current_frame.copy()
+            frame = self._latest_frame()
+            if frame is not None:
+                return frame.copy()
             return None
     
     def read(self) -> Tuple[bool, Optional[np.ndarray]]:
@@ -202,6 +421,59 @@ class CameraController:
         frame = self.read_frame()
         return (frame is not None, frame)
     
+    def read_into(self, out: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Copy the current frame into a caller-owned buffer (thread-safe)
+        
+        Args:
+            out: Buffer from the previous call, reused when the size matches
+        
+        Returns:
+            Tuple of (success, frame); frame is out unless it had to be (re)allocated
+        """
+        with self.frame_lock:
+            frame = self._latest_frame()
+            if frame is None:
+                return False, out
+            if out is None or out.shape != frame.shape:
+                return True, frame.copy()
+            np.copyto(out, frame)
+            return True, out
+    
+    def read_new(self, last_count: int) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Get the current frame only if it is newer than the one already seen
+        
+        Args:
+            last_count: frame_count returned by the previous call (0 initially)
+        
+        Returns:
+            Tuple of (frame_count, frame); frame is None if nothing new arrived
+        """
+        with self.frame_lock:
+            if self.frame_count == last_count or self._latest_frame() is None:
+                return last_count, None
+            return self.frame_count, self.current_frame.copy()
+    
+    def wait_new(self, last_count: int, timeout: Optional[float] = 1.0) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Block until a frame newer than the one already seen arrives, then copy it
+        
+        Args:
+            last_count: frame_count returned by the previous call (0 initially)
+            timeout: Maximum seconds to wait (None waits forever)
+        
+        Returns:
+            Tuple of (frame_count, frame); frame is None if the wait timed out
+        """
+        with self.frame_cond:
+            if not self.frame_cond.wait_for(lambda: self.frame_count != last_count, timeout=timeout):
+                return last_count, None
+            frame = self._latest_frame()
+            if frame is None:
+                return last_count, None
+            return self.frame_count, frame.copy()
+    
     def set_servo_angles(self, pan: Optional[int] = None, tilt: Optional[int] = None):
         """
         Set servo angles for camera pan/tilt
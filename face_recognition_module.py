@@ -12,7 +12,9 @@ import json
 import os
 from typing import List, Tuple, Optional, Dict
 from camera_controller import CameraController
-from vision_utils import ServoTracker, draw_bounding_box, calculate_center, FPSCounter
+from vision_utils import (ServoTracker, draw_bounding_box, calculate_center, FPSCounter, FaceDetection,
+                          detections_to_soa)
+from vision_utils import draw_landmarks as draw_landmark_points  # draw_detections has a draw_landmarks flag
 
 
 class FaceRecognitionModule:
@@ -66,6 +68,8 @@ class FaceRecognitionModule:
         
         # Detection results
         self.last_detections = []
+        self._soa = None
+        self._soa_source = None
         self.tracked_face_idx = 0  # Index of face to track
         
         print("Face Recognition Module initialized")
@@ -95,7 +99,7 @@ class FaceRecognitionModule:
         except Exception as e:
             print(f"Error saving face database: {e}")
     
-    def detect_faces(self, frame: np.ndarray) -> List[Dict]:
+    def detect_faces(self, frame: np.ndarray) -> List[FaceDetection]:
         """
         Detect faces in frame
         
@@ -135,12 +139,12 @@ class FaceRecognitionModule:
                 # Get confidence score
                 confidence = detection.score[0] if hasattr(detection, 'score') else 1.0
                 
-                detections.append({
-                    'bbox': (x, y, width, height),
-                    'confidence': confidence,
-                    'center': calculate_center((x, y, width, height)),
-                    'landmarks': self._extract_landmarks(detection, w, h)
-                })
+                detections.append(FaceDetection(
+                    bbox=(x, y, width, height),
+                    confidence=confidence,
+                    center=calculate_center((x, y, width, height)),
+                    landmarks=self._extract_landmarks(detection, w, h)
+                ))
         
         self.last_detections = detections
         return detections
@@ -257,6 +261,14 @@ class FaceRecognitionModule:
         
         return None, best_similarity
     
+    @property
+    def last_detections_soa(self) -> dict:
+        """Struct-of-arrays view of last_detections (see detections_to_soa), built on first access"""
+        if self._soa_source is not self.last_detections:
+            self._soa = detections_to_soa(self.last_detections, label_field=None)
+            self._soa_source = self.last_detections
+        return self._soa
+    
     def track_face(self, face_idx: int = 0):
         """
         Track a detected face with camera servos
@@ -271,7 +283,7 @@ class FaceRecognitionModule:
             return
         
         face = self.last_detections[face_idx]
-        cx, cy = face['center']
+        cx, cy = face.center
         
         # Calculate servo angles
         pan, tilt = self.servo_tracker.calculate_servo_angles(cx, cy)
@@ -291,8 +303,8 @@ class FaceRecognitionModule:
             draw_landmarks: Draw facial landmarks
         """
         for i, face in enumerate(self.last_detections):
-            bbox = face['bbox']
-            confidence = face['confidence']
+            bbox = face.bbox
+            confidence = face.confidence
             
             # Recognize face if enabled
             label = f"Face {i+1}"
@@ -313,9 +325,8 @@ class FaceRecognitionModule:
             draw_bounding_box(frame, bbox, label, color)
             
             # Draw landmarks
-            if draw_landmarks and face['landmarks']:
-                for landmark in face['landmarks']:
-                    cv2.circle(frame, landmark, 3, color, -1)
+            if draw_landmarks and face.landmarks:
+                draw_landmark_points(frame, face.landmarks, color=color, radius=3)
             
             # Mark tracked face
             if i == self.tracked_face_idx:
@@ -330,13 +341,13 @@ class FaceRecognitionModule:
         Process frame for face detection and recognition
         
         Args:
-            frame: Input frame
+            frame: Input frame (annotated in place, never copied)
             recognize: Enable face recognition
             track: Enable face tracking with servos
             draw: Draw detections on frame
         
         Returns:
-            Processed frame with annotations
+            The same frame object, for chaining
         """
         # Detect faces
         self.detect_faces(frame)
@@ -420,7 +431,7 @@ def main():
                 if len(face_rec.last_detections) > 0:
                     name = input("Enter name for this face: ")
                     face = face_rec.last_detections[face_rec.tracked_face_idx]
-                    face_rec.add_face(frame, face['bbox'], name)
+                    face_rec.add_face(frame, face.bbox, name)
             elif key == ord('r'):
                 recognize_enabled = not recognize_enabled
                 print(f"Recognition: {'ON' if recognize_enabled else 'OFF'}")
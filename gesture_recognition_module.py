@@ -10,7 +10,9 @@ import mediapipe as mp
 import numpy as np
 from typing import List, Tuple, Optional, Dict, Callable
 from camera_controller import CameraController
-from vision_utils import ServoTracker, draw_landmarks, draw_connections, calculate_center, FPSCounter
+from vision_utils import (ServoTracker, draw_landmarks, draw_connections, calculate_center,
+                          calculate_distance_sq, get_text_size, FPSCounter, HandDetection,
+                          detections_to_soa)
 
 
 class GestureRecognitionModule:
@@ -90,6 +92,8 @@ class GestureRecognitionModule:
         
         # Detection results
         self.last_detections = []
+        self._soa = None
+        self._soa_source = None
         self.tracked_hand_idx = 0
         
         # Gesture callbacks
@@ -107,7 +111,7 @@ class GestureRecognitionModule:
         """
         self.gesture_callbacks[gesture_name] = callback
     
-    def detect_hands(self, frame: np.ndarray) -> List[Dict]:
+    def detect_hands(self, frame: np.ndarray) -> List[HandDetection]:
         """
         Detect hands in frame
         
@@ -155,13 +159,13 @@ class GestureRecognitionModule:
                 # Recognize gesture
                 gesture = self.recognize_gesture(landmarks)
                 
-                detections.append({
-                    'landmarks': landmarks,
-                    'bbox': bbox,
-                    'center': center,
-                    'handedness': handedness,
-                    'gesture': gesture
-                })
+                detections.append(HandDetection(
+                    landmarks=landmarks,
+                    bbox=bbox,
+                    center=center,
+                    handedness=handedness,
+                    gesture=gesture
+                ))
         
         self.last_detections = detections
         return detections
@@ -246,10 +250,8 @@ class GestureRecognitionModule:
             thumb_tip = landmarks[self.THUMB_TIP]
             index_tip = landmarks[self.INDEX_FINGER_TIP]
             
-            distance = np.sqrt((thumb_tip[0] - index_tip[0])**2 + 
-                             (thumb_tip[1] - index_tip[1])**2)
-            
-            if distance < 40:  # Pixels
+            # Compare squared distance against 40 px squared (no sqrt needed)
+            if calculate_distance_sq(thumb_tip, index_tip) < 40 * 40:
                 return "OK_SIGN"
         
         # Three fingers
@@ -264,6 +266,14 @@ class GestureRecognitionModule:
         
         return "UNKNOWN"
     
+    @property
+    def last_detections_soa(self) -> dict:
+        """Struct-of-arrays view of last_detections (see detections_to_soa), built on first access"""
+        if self._soa_source is not self.last_detections:
+            self._soa = detections_to_soa(self.last_detections, label_field='gesture')
+            self._soa_source = self.last_detections
+        return self._soa
+    
     def track_hand(self, hand_idx: int = 0):
         """
         Track a detected hand with camera servos
@@ -278,7 +288,7 @@ class GestureRecognitionModule:
             return
         
         hand = self.last_detections[hand_idx]
-        cx, cy = hand['center']
+        cx, cy = hand.center
         
         # Calculate servo angles
         pan, tilt = self.servo_tracker.calculate_servo_angles(cx, cy)
@@ -298,10 +308,10 @@ class GestureRecognitionModule:
             draw_bbox: Draw bounding box
         """
         for i, hand in enumerate(self.last_detections):
-            landmarks = hand['landmarks']
-            bbox = hand['bbox']
-            gesture = hand['gesture']
-            handedness = hand['handedness']
+            landmarks = hand.landmarks
+            bbox = hand.bbox
+            gesture = hand.gesture
+            handedness = hand.handedness
             
             # Draw skeleton
             if draw_skeleton:
@@ -322,7 +332,7 @@ class GestureRecognitionModule:
                 
                 # Draw label
                 label = f"{handedness}: {gesture}"
-                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+                label_size, _ = get_text_size(label, 0.6, 2)
                 label_w, label_h = label_size
                 
                 cv2.rectangle(frame, (x, y - label_h - 10), (x + label_w, y), color, -1)
@@ -342,13 +352,13 @@ class GestureRecognitionModule:
         Process frame for gesture recognition
         
         Args:
-            frame: Input frame
+            frame: Input frame (annotated in place, never copied)
             track: Enable hand tracking with servos
             draw: Draw detections on frame
             trigger_callbacks: Trigger gesture callbacks
         
         Returns:
-            Processed frame with annotations
+            The same frame object, for chaining
         """
         # Detect hands
         self.detect_hands(frame)
@@ -360,7 +370,7 @@ class GestureRecognitionModule:
         # Trigger gesture callbacks
         if trigger_callbacks:
             for hand in self.last_detections:
-                gesture = hand['gesture']
+                gesture = hand.gesture
                 if gesture in self.gesture_callbacks:
                     self.gesture_callbacks[gesture]()
         
@@ -435,7 +445,7 @@ def main():
             
             # Add gesture info
             for i, hand in enumerate(gesture_rec.last_detections):
-                info.append(f"Hand {i+1}: {hand['gesture']}")
+                info.append(f"Hand {i+1}: {hand.gesture}")
             
             y_pos = 60
             for text in info:
@@ -1,4 +1,6 @@
 
+import queue
+import threading
 import time
 
 # IR Remote Key Codes (NEC Protocol)
@@ -26,6 +28,9 @@ IR_KEYS = {
     'Nine': 0x1A
 }
 
+# Keys that toggle state: a held key must not repeat them
+TOGGLE_KEYS = {IR_KEYS['Sound'], IR_KEYS['Light']}
+
 class IRRemote:
     def __init__(self, bot_instance):
         """
@@ -34,6 +39,12 @@ class IRRemote:
         """
         self.bot = bot_instance
         self.enabled = False
+        
+        # Background listener state (see start_listener)
+        self.codes = queue.SimpleQueue()
+        self._listener = None
+        self._listening = False
+        
         self.enable()
 
     def enable(self):
@@ -45,12 +56,76 @@ class IRRemote:
             print("Failed to enable IR request")
 
     def disable(self):
+        self.stop_listener()
         try:
             self.bot.Ctrl_IR_Switch(0)
             self.enabled = False
         except:
             pass
 
+    def start_listener(self, poll_interval=0.02, repeat_interval=0.15, toggle_interval=0.5):
+        """
+        Poll the IR register on a background thread and queue decoded codes.
+        :param poll_interval: Seconds between register reads
+        :param repeat_interval: A held key is queued again at most this often
+        :param toggle_interval: A TOGGLE_KEYS key is only queued again after it
+                                has not been seen for this long (held = one press)
+        """
+        if self._listener is not None:
+            return
+        self._listening = True
+        self._listener = threading.Thread(target=self._listen,
+                                          args=(poll_interval, repeat_interval, toggle_interval),
+                                          daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        """Stop the background listener thread, if running"""
+        if self._listener is None:
+            return
+        self._listening = False
+        self._listener.join(timeout=1.0)
+        self._listener = None
+
+    def _listen(self, poll_interval, repeat_interval, toggle_interval):
+        last_code = None
+        last_time = 0.0
+        toggle_seen = {}  # Toggle key code -> when it was last read
+        while self._listening:
+            code = self.read_code()
+            now = time.monotonic()
+            if code in TOGGLE_KEYS:
+                # Debounced on when the key was last seen, so holding it (or a
+                # missed poll between repeat frames) never toggles twice
+                if now - toggle_seen.get(code, 0.0) >= toggle_interval:
+                    self.codes.put(code)
+                toggle_seen[code] = now
+            elif code is not None:
+                # The register keeps reporting a held key, so rate-limit repeats
+                if code != last_code or now - last_time >= repeat_interval:
+                    self.codes.put(code)
+                    last_time = now
+            last_code = code
+            time.sleep(poll_interval)
+
+    def clear_codes(self):
+        """Drop any codes queued but not yet handled"""
+        try:
+            while True:
+                self.codes.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get_code(self, timeout=None):
+        """
+        Wait for the next code queued by the listener.
+        Returns the raw code (int) or None if nothing arrived within timeout.
+        """
+        try:
+            return self.codes.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
     def read_code(self):
         """
         Reads one byte from the IR register.
@@ -5,12 +5,14 @@
 3D object detection and tracking using MediaPipe Objectron
 """
 
+import os
 import cv2
 import mediapipe as mp
 import numpy as np
-from typing import List, Tuple, Optional, Dict
+from typing import List, Optional
 from camera_controller import CameraController
-from vision_utils import ServoTracker, calculate_center, estimate_depth_from_bbox, FPSCounter
+from vision_utils import (ServoTracker, calculate_center, estimate_depth_from_bbox, get_text_size,
+                          FPSCounter, ObjectDetection, detections_to_soa)
 
 
 class Object3DDetectionModule:
@@ -52,7 +54,8 @@ class Object3DDetectionModule:
                  max_num_objects: int = 5,
                  min_detection_confidence: float = 0.5,
                  min_tracking_confidence: float = 0.5,
-                 enable_tracking: bool = True):
+                 enable_tracking: bool = True,
+                 headless: bool = False):
         """
         Initialize 3D object detection module
         
@@ -63,32 +66,44 @@ class Object3DDetectionModule:
             min_detection_confidence: Minimum confidence for object detection
             min_tracking_confidence: Minimum confidence for object tracking
             enable_tracking: Enable servo tracking for detected objects
+            headless: Never draw annotations (no display attached)
         """
         self.camera = camera
         self.enable_tracking = enable_tracking
+        self.headless = headless
         
         # Normalize object type
         object_type_upper = object_type.upper()
         if object_type_upper in self.MODEL_NAMES:
             self.object_type_key = object_type_upper
-            model_name = self.MODEL_NAMES[object_type_upper]
         else:
             print(f"Warning: Unknown object type '{object_type}'. Using 'Cup'")
             self.object_type_key = 'CUP'
-            model_name = 'Cup'
         
         # Initialize MediaPipe Objectron
         self.mp_objectron = mp.solutions.objectron
         self.mp_drawing = mp.solutions.drawing_utils
-        
-        self.objectron = self.mp_objectron.Objectron(
-            static_image_mode=False,
-            max_num_objects=max_num_objects,
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence,
-            model_name=model_name  # Use the correct model name format
-        )
-        
+
+        self.max_num_objects = max_num_objects
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+
+        # One Objectron graph per model, built on first use and kept so that
+        # switching object types does not reload the model from disk
+        self._objectrons = {}
+        self.objectron = self._get_objectron(self.object_type_key)
+
+        # Landmark scratch buffers shared by every detection, allocated once
+        # (Objectron reports 9 box landmarks per object)
+        self._lm2d = np.empty((max_num_objects, 9, 2), np.float32)
+        self._lm3d = np.empty((max_num_objects, 9, 3), np.float32)
+
+        # Pose fields are fixed by the installed MediaPipe build, so probe the
+        # result schema once instead of calling hasattr() per object per frame
+        outputs_type = getattr(self.mp_objectron, 'ObjectronOutputs', None)
+        output_fields = getattr(outputs_type, '_fields', ())
+        self._has_pose = 'rotation' in output_fields and 'translation' in output_fields
+
         # Servo tracker for camera control
         self.servo_tracker = None
         if camera and enable_tracking:
@@ -99,11 +114,35 @@ class Object3DDetectionModule:
         
         # Detection results
         self.last_detections = []
+        self._soa = None
+        self._soa_source = None
         self.tracked_object_idx = 0
         
         print(f"3D Object Detection Module initialized (detecting {self.OBJECT_TYPES[self.object_type_key]})")
     
-    def detect_objects(self, frame: np.ndarray) -> List[Dict]:
+    def _get_objectron(self, object_type_key: str):
+        """
+        Get the Objectron graph for an object type, creating it on first use
+        
+        Args:
+            object_type_key: Key into MODEL_NAMES ('SHOE', 'CHAIR', 'CUP', 'CAMERA')
+        
+        Returns:
+            MediaPipe Objectron instance
+        """
+        objectron = self._objectrons.get(object_type_key)
+        if objectron is None:
+            objectron = self.mp_objectron.Objectron(
+                static_image_mode=False,
+                max_num_objects=self.max_num_objects,
+                min_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=self.min_tracking_confidence,
+                model_name=self.MODEL_NAMES[object_type_key]  # Use the correct model name format
+            )
+            self._objectrons[object_type_key] = objectron
+        return objectron
+    
+    def detect_objects(self, frame: np.ndarray) -> List[ObjectDetection]:
         """
         Detect 3D objects in frame
         
@@ -112,6 +151,8 @@ class Object3DDetectionModule:
         
         Returns:
             List of detected objects with 3D landmarks and bounding boxes
+            (ObjectDetection records; landmarks_2d is an (N, 2) int32 array,
+            landmarks_3d an (N, 3) float32 array)
         """
         # Convert to RGB for MediaPipe
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -123,27 +164,30 @@ class Object3DDetectionModule:
         
         if results.detected_objects:
             h, w, _ = frame.shape
+            lm2d = self._lm2d
+            lm3d = self._lm3d
             
-            for obj in results.detected_objects:
+            for i, obj in enumerate(results.detected_objects[:self.max_num_objects]):
                 # Extract 3D landmarks (9 points defining the 3D box)
-                landmarks_3d = []
-                for landmark in obj.landmarks_3d.landmark:
-                    landmarks_3d.append((landmark.x, landmark.y, landmark.z))
+                n3d = 0
+                for n3d, landmark in enumerate(obj.landmarks_3d.landmark, 1):
+                    lm3d[i, n3d - 1] = (landmark.x, landmark.y, landmark.z)
                 
-                # Extract 2D landmarks (projected onto image)
-                landmarks_2d = []
-                for landmark in obj.landmarks_2d.landmark:
-                    x = int(landmark.x * w)
-                    y = int(landmark.y * h)
-                    landmarks_2d.append((x, y))
+                # Extract 2D landmarks (projected onto image) and scale in place
+                n2d = 0
+                for n2d, landmark in enumerate(obj.landmarks_2d.landmark, 1):
+                    lm2d[i, n2d - 1] = (landmark.x, landmark.y)
                 
                 # Calculate 2D bounding box from landmarks
-                if landmarks_2d:
-                    x_coords = [lm[0] for lm in landmarks_2d]
-                    y_coords = [lm[1] for lm in landmarks_2d]
+                if n2d:
+                    points = lm2d[i, :n2d]
+                    points[:, 0] *= w
+                    points[:, 1] *= h
+                    # Truncate like int() so pixel positions match the drawing code
+                    landmarks_2d = points.astype(np.int32)
                     
-                    x_min, x_max = min(x_coords), max(x_coords)
-                    y_min, y_max = min(y_coords), max(y_coords)
+                    x_min, y_min = landmarks_2d.min(axis=0).tolist()
+                    x_max, y_max = landmarks_2d.max(axis=0).tolist()
                     
                     bbox = (x_min, y_min, x_max - x_min, y_max - y_min)
                     center = calculate_center(bbox)
@@ -152,23 +196,31 @@ class Object3DDetectionModule:
                     depth = estimate_depth_from_bbox(bbox[2])
                     
                     # Get rotation and translation (pose)
-                    rotation = obj.rotation if hasattr(obj, 'rotation') else None
-                    translation = obj.translation if hasattr(obj, 'translation') else None
+                    rotation = obj.rotation if self._has_pose else None
+                    translation = obj.translation if self._has_pose else None
                     
-                    detections.append({
-                        'object_type': self.OBJECT_TYPES[self.object_type_key],
-                        'landmarks_2d': landmarks_2d,
-                        'landmarks_3d': landmarks_3d,
-                        'bbox': bbox,
-                        'center': center,
-                        'estimated_depth': depth,
-                        'rotation': rotation,
-                        'translation': translation
-                    })
+                    detections.append(ObjectDetection(
+                        object_type=self.OBJECT_TYPES[self.object_type_key],
+                        landmarks_2d=landmarks_2d,
+                        landmarks_3d=lm3d[i, :n3d].copy(),
+                        bbox=bbox,
+                        center=center,
+                        estimated_depth=depth,
+                        rotation=rotation,
+                        translation=translation
+                    ))
         
         self.last_detections = detections
         return detections
     
+    @property
+    def last_detections_soa(self) -> dict:
+        """Struct-of-arrays view of last_detections (see detections_to_soa), built on first access"""
+        if self._soa_source is not self.last_detections:
+            self._soa = detections_to_soa(self.last_detections, label_field='object_type')
+            self._soa_source = self.last_detections
+        return self._soa
+    
     def track_object(self, object_idx: int = 0):
         """
         Track a detected object with camera servos
@@ -183,7 +235,7 @@ class Object3DDetectionModule:
             return
         
         obj = self.last_detections[object_idx]
-        cx, cy = obj['center']
+        cx, cy = obj.center
         
         # Calculate servo angles
         pan, tilt = self.servo_tracker.calculate_servo_angles(cx, cy)
@@ -191,13 +243,13 @@ class Object3DDetectionModule:
         # Update camera servos
         self.camera.set_servo_angles(pan=pan, tilt=tilt)
     
-    def draw_3d_bbox(self, frame: np.ndarray, landmarks_2d: List[Tuple[int, int]]):
+    def draw_3d_bbox(self, frame: np.ndarray, landmarks_2d: np.ndarray):
         """
         Draw 3D bounding box on frame
         
         Args:
             frame: Image frame to draw on
-            landmarks_2d: List of 2D landmark points
+            landmarks_2d: (N, 2) int array (or list) of 2D landmark points
         """
         # MediaPipe Objectron provides 9 landmarks defining a 3D box:
         # 0: center
@@ -206,6 +258,9 @@ class Object3DDetectionModule:
         if len(landmarks_2d) < 9:
             return
         
+        # OpenCV drawing calls want plain int tuples
+        landmarks_2d = [tuple(point) for point in np.asarray(landmarks_2d).tolist()]
+        
         # Define edges of the 3D box
         edges = [
             (1, 2), (2, 3), (3, 4), (4, 1),  # Bottom face
@@ -242,10 +297,10 @@ class Object3DDetectionModule:
             show_depth: Show estimated depth
         """
         for i, obj in enumerate(self.last_detections):
-            landmarks_2d = obj['landmarks_2d']
-            bbox = obj['bbox']
-            depth = obj['estimated_depth']
-            obj_type = obj['object_type']
+            landmarks_2d = obj.landmarks_2d
+            bbox = obj.bbox
+            depth = obj.estimated_depth
+            obj_type = obj.object_type
             
             # Draw 3D bounding box
             if draw_3d_box:
@@ -262,7 +317,7 @@ class Object3DDetectionModule:
                 if show_depth:
                     label += f" (D:{depth:.1f})"
                 
-                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+                label_size, _ = get_text_size(label, 0.6, 2)
                 label_w, label_h = label_size
                 
                 cv2.rectangle(frame, (x, y - label_h - 10), (x + label_w, y), color, -1)
@@ -276,18 +331,23 @@ class Object3DDetectionModule:
     
     def process_frame(self, frame: np.ndarray,
                      track: bool = True,
-                     draw: bool = True) -> np.ndarray:
+                     draw: bool = True,
+                     headless: Optional[bool] = None) -> np.ndarray:
         """
         Process frame for 3D object detection
         
         Args:
-            frame: Input frame
+            frame: Input frame (annotated in place, never copied)
             track: Enable object tracking with servos
             draw: Draw detections on frame
+            headless: Skip drawing entirely (defaults to the module setting)
         
         Returns:
-            Processed frame with annotations
+            The same frame object, for chaining
         """
+        if headless is None:
+            headless = self.headless
+        
         # Detect objects
         self.detect_objects(frame)
         
@@ -296,7 +356,7 @@ class Object3DDetectionModule:
             self.track_object(self.tracked_object_idx)
         
         # Draw detections
-        if draw:
+        if draw and not headless:
             self.draw_detections(frame)
         
         return frame
@@ -316,24 +376,18 @@ class Object3DDetectionModule:
             return
         
         self.object_type_key = object_type_upper
-        model_name = self.MODEL_NAMES[object_type_upper]
-        
-        # Recreate objectron with new model
-        self.objectron.close()
-        self.objectron = self.mp_objectron.Objectron(
-            static_image_mode=False,
-            max_num_objects=5,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5,
-            model_name=model_name  # Use correct model name format
-        )
+        
+        # Swap to the cached graph for this model (built once on first switch)
+        self.objectron = self._get_objectron(object_type_upper)
         
         print(f"Switched to detecting: {self.OBJECT_TYPES[self.object_type_key]}")
     
     def close(self):
         """Cleanup resources"""
-        if self.objectron:
-            self.objectron.close()
+        for objectron in self._objectrons.values():
+            objectron.close()
+        self._objectrons.clear()
+        self.objectron = None
 
 
 def main():
@@ -350,12 +404,18 @@ def main():
     print("  'b' - Toggle 2D bbox")
     print("  'd' - Toggle depth display")
     
+    # Without a display there is nothing to draw on or read keys from
+    headless = not os.environ.get('DISPLAY')
+    if headless:
+        print("No DISPLAY found - running headless (Ctrl+C to quit)")
+    
     # Initialize camera
     camera = CameraController(camera_id=0, width=640, height=480, enable_servos=True)
     camera.start_capture()
     
     # Initialize 3D object detection
-    object_3d = Object3DDetectionModule(camera=camera, object_type='Cup', enable_tracking=True)
+    object_3d = Object3DDetectionModule(camera=camera, object_type='Cup',
+                                        enable_tracking=True, headless=headless)
     
     # FPS counter
     fps_counter = FPSCounter()
@@ -376,6 +436,8 @@ def main():
             
             # Display FPS
             fps = fps_counter.update()
+            if headless:
+                continue
             fps_counter.draw_fps(frame, fps)
             
             # Display info
@@ -428,7 +490,8 @@ def main():
     finally:
         object_3d.close()
         camera.close()
-        cv2.destroyAllWindows()
+        if not headless:
+            cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
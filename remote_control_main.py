@@ -1,44 +1,46 @@
-
-print("DEBUG: Script Start (Pre-imports)")
-import time
+import argparse
+import logging
 import sys
-import signal
 
-# Flush stdout to force print visibility
-sys.stdout.flush()
+log = logging.getLogger(__name__)
 
 try:
-    print("DEBUG: Importing car_driver...")
     from car_driver import CarDriver
-    print("DEBUG: car_driver imported.")
 except Exception as e:
     print(f"CRITICAL ERROR importing car_driver: {e}")
     sys.exit(1)
 
 try:
-    print("DEBUG: Importing ir_decoder...")
     from ir_decoder import IRRemote
-    print("DEBUG: ir_decoder imported.")
 except Exception as e:
     print(f"CRITICAL ERROR importing ir_decoder: {e}")
     sys.exit(1)
 
 try:
-    print("DEBUG: Importing auto_driver...")
     from auto_driver import ObstacleAvoidance
-    print("DEBUG: auto_driver imported.")
 except Exception as e:
     print(f"CRITICAL ERROR importing auto_driver: {e}")
     sys.exit(1)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="IR remote control for Raspbot V2")
+    parser.add_argument('--debug', action='store_true',
+                        help='Print debug messages')
+    parser.add_argument('--mode', choices=['manual', 'auto', 'toggleable'], default='toggleable',
+                        help="manual: remote driving only, auto: obstacle avoidance only, "
+                             "toggleable: 'Sound' key switches between the two (default)")
+    return parser.parse_args()
+
 def main():
-    print("DEBUG: Entering main()...")
-    sys.stdout.flush()
-    
+    args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING,
+                        format='%(levelname)s: %(message)s')
+    log.debug("Entering main()...")
+
     # Initialize Car Driver
     try:
         car = CarDriver()
-        print("DEBUG: CarDriver initialized.")
+        log.debug("CarDriver initialized.")
     except Exception as e:
         print(f"ERROR: CarDriver init failed: {e}")
         return
@@ -47,56 +49,53 @@ def main():
     try:
         # Pass the bot instance
         ir = IRRemote(car.get_bot_instance())
-        print("DEBUG: IRRemote initialized.")
+        log.debug("IRRemote initialized.")
     except Exception as e:
         print(f"ERROR: IRRemote init failed: {e}")
         return
-    
+
     # Initialize Autopilot
     try:
         avoidance = ObstacleAvoidance(car)
-        print("DEBUG: ObstacleAvoidance initialized.")
+        log.debug("ObstacleAvoidance initialized.")
     except Exception as e:
         print(f"ERROR: ObstacleAvoidance init failed: {e}")
         return
-    
+
+    toggleable = args.mode == 'toggleable'
+    mode = 'AUTO' if args.mode == 'auto' else 'MANUAL'
+    if mode == 'AUTO':
+        avoidance.start()
+
+    # Register polling runs on its own thread; the loop below just waits on its queue
+    ir.start_listener()
+
     print("Ready! Press buttons on the remote.")
-    
+
     running = True
-    mode = 'MANUAL'
-    loop_count = 0
 
     try:
         while running:
-            # Heartbeat to prove it's alive
-            loop_count += 1
-            if loop_count % 100 == 0:
-                # print(".", end="", flush=True) 
-                pass
-
-            # Read IR Code
-            try:
-                code = ir.read_code()
-            except Exception as e:
-                print(f"ERROR reading IR: {e}")
-                code = None
-            
+            # Wait briefly for the next IR code (this also paces the loop)
+            code = ir.get_code(timeout=0.01)
+
             # --- IR Handling ---
             if code is not None:
                 key = ir.get_key_name(code)
                 if key:
-                    print(f"IR Key: {key} (Hex: {hex(code)})")
-                    
-                    if key == 'Sound':
-                        print(f"DEBUG: Toggling Mode from {mode}...")
+                    log.debug("IR Key: %s (Hex: %#x)", key, code)
+
+                    if key == 'Sound' and toggleable:
+                        log.debug("Toggling Mode from %s...", mode)
                         if mode == 'MANUAL':
                             mode = 'AUTO'
                             avoidance.start()
                         else:
                             mode = 'MANUAL'
                             avoidance.stop()
-                        
-                        time.sleep(0.3)
+
+                        # Repeats of keys pressed before the switch belong to the old mode
+                        ir.clear_codes()
                         continue
 
                     if mode == 'MANUAL':
@@ -110,25 +109,18 @@ def main():
                         elif key == 'Light': car.cycle_lights()
                         elif key == 'Plus': car.change_speed(20)
                         elif key == 'Minus': car.change_speed(-20)
-                        
-                        time.sleep(0.15)
                     else:
-                        print(f"DEBUG: Ignored manual key {key} in AUTO mode")
-                        
-                else:
-                    pass
-            
+                        log.debug("Ignored manual key %s in AUTO mode", key)
+
             # --- Autonomous Loop ---
             if mode == 'AUTO':
                 avoidance.step()
-            
-            time.sleep(0.01)
 
     except KeyboardInterrupt:
         print("\nStopping...")
-    
+
     finally:
-        print("DEBUG: Cleanup...")
+        log.debug("Cleanup...")
         avoidance.stop()
         car.stop()
         car.lights_off()
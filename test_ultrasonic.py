@@ -2,6 +2,9 @@
 import time
 from car_driver import CarDriver
 
+# Seconds between distance reads (the HAT has no data-ready signal to wait on)
+SAMPLE_INTERVAL = 0.1
+
 def main():
     print("Initializing Ultrasonic Sensor Test...")
     car = CarDriver()
@@ -12,17 +15,29 @@ def main():
     
     print("Testing... Press Ctrl+C to stop.")
     
+    last_dist = None
+    next_read = time.monotonic()
+    
     try:
         while True:
-            # Read distance
+            # Read distance, reporting only when it changes
             dist = car.get_distance()
             
-            print(f"Distance: {dist} mm")
-            
-            if dist == 0:
-                print("Warning: Reading 0mm (Check wirings or sensor position)")
+            if dist != last_dist:
+                print(f"Distance: {dist} mm")
+                
+                if dist == 0:
+                    print("Warning: Reading 0mm (Check wirings or sensor position)")
+                
+                last_dist = dist
             
-            time.sleep(0.5)
+            # Sleep until the next sample slot; if we fell behind, resync instead of bursting
+            next_read += SAMPLE_INTERVAL
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_read = time.monotonic()
             
     except KeyboardInterrupt:
         print("\nStopping Test...")
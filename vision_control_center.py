@@ -7,27 +7,54 @@ Unified GUI launcher for all vision features
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
-import threading
+import asyncio
+import json
 import os
+import queue
 import sys
 
+from vision_worker import SESSION_DONE
+
+# Launch commands (built once; sys.executable keeps them absolute for posix_spawn)
+WORKER_CMD = (sys.executable, "-u", "vision_worker.py")
+WEB_CMD = (sys.executable, "vision_web_viewer.py")
+
 
 class VisionControlCenter:
     """Main GUI control center for vision system"""
     
+    # Scrollback cap for the output log (older lines are dropped)
+    MAX_LINES = 2000
+    
     def __init__(self, root):
         self.root = root
         self.root.title("🤖 Raspbot V2 - Vision Control Center")
         self.root.geometry("900x700")
         self.root.configure(bg='#1e3c72')
         
-        # Running process
+        # Running process (driven by an asyncio loop stepped from Tk, see _pump_asyncio)
+        self.loop = asyncio.new_event_loop()
         self.current_process = None
-        self.log_thread = None
+        self.process_task = None
         self.running = False
         
+        # Long-lived vision worker for headless/recording sessions (see vision_worker.py)
+        self._worker = None
+        self._stopping = False
+        
+        # Pending log lines; log() may be called from any thread, and only
+        # _drain_log_q (on the Tk main loop) touches the widget
+        self._log_q = queue.Queue()
+        
         self.setup_ui()
+        self.root.after(10, self._pump_asyncio)
+        self.root.after(50, self._drain_log_q)
+    
+    def _pump_asyncio(self):
+        """Run one pass of the asyncio loop from the Tk main loop"""
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.root.after(10, self._pump_asyncio)
     
     def setup_ui(self):
         """Setup the user interface"""
@@ -127,6 +154,15 @@ class VisionControlCenter:
         )
         record_frame.pack(fill=tk.X, pady=(0, 15))
         
+        self.record_mode_var = tk.StringVar(value='face')
+        ttk.Combobox(
+            record_frame,
+            textvariable=self.record_mode_var,
+            values=('face', 'gesture', '3d_object'),
+            state='readonly',
+            font=('Arial', 10)
+        ).pack(fill=tk.X, pady=5)
+        
         self.duration_var = tk.StringVar(value="30")
         duration_frame = tk.Frame(record_frame, bg='#2a5298')
         duration_frame.pack(fill=tk.X, pady=5)
@@ -244,10 +280,29 @@ class VisionControlCenter:
         self.log("Click a button to launch vision features")
     
     def log(self, message):
-        """Add message to log"""
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.root.update()
+        """Add message to log (queued, written out by _drain_log_q)"""
+        self._log_q.put_nowait(f"{message}\n")
+    
+    def _drain_log_q(self):
+        """Write all queued log lines to the widget in one insert"""
+        chunks = []
+        try:
+            while True:
+                chunks.append(self._log_q.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if chunks:
+            self.log_text.insert(tk.END, "".join(chunks))
+            
+            # Trim scrollback with a single delete once over the cap
+            n = int(self.log_text.index('end-1c').split('.')[0])
+            if n > self.MAX_LINES:
+                self.log_text.delete("1.0", f"{n - self.MAX_LINES + 1}.0")
+            
+            self.log_text.see(tk.END)
+        
+        self.root.after(50, self._drain_log_q)
     
     def clear_log(self):
         """Clear log output"""
@@ -267,14 +322,21 @@ class VisionControlCenter:
         self.log("🌐 Starting Web Viewer...")
         self.log("="*50)
         
-        cmd = [sys.executable, "vision_web_viewer.py"]
-        self.run_process(cmd, "Web Viewer Running")
+        self.run_process(WEB_CMD, "Web Viewer Running")
         
         self.log("\n📱 Access the web interface:")
         self.log("   http://raspberrypi:5000")
         self.log("   http://raspberrypi.local:5000")
         self.log("   http://localhost:5000")
     
+    def _get_duration(self):
+        """Parse the duration field, warning on bad input"""
+        try:
+            return int(self.duration_var.get())
+        except ValueError:
+            messagebox.showwarning("Invalid Duration", "Duration must be a whole number of seconds")
+            return None
+    
     def launch_headless(self, mode):
         """Launch headless mode"""
         if self.running:
@@ -285,15 +347,12 @@ class VisionControlCenter:
         self.log(f"🎯 Starting Headless Mode: {mode.upper()}")
         self.log("="*50)
         
-        duration = self.duration_var.get()
-        cmd = [
-            sys.executable,
-            "vision_system_headless.py",
-            "--mode", mode,
-            "--duration", duration
-        ]
+        duration = self._get_duration()
+        if duration is None:
+            return
+        command = {'op': 'run', 'mode': mode, 'duration': duration, 'save_video': False}
         
-        self.run_process(cmd, f"Headless {mode} Running")
+        self.run_worker_session(command, f"Headless {mode} Running")
     
     def launch_video_record(self):
         """Launch video recording"""
@@ -301,38 +360,18 @@ class VisionControlCenter:
             messagebox.showwarning("Already Running", "Please stop the current process first")
             return
         
-        mode = messagebox.askquestion(
-            "Select Mode",
-            "Record Face Detection?\n\n"
-            "Yes = Face Detection\n"
-            "No = Choose Other Mode"
-        )
-        
-        if mode == 'yes':
-            selected_mode = 'face'
-        else:
-            # Show options
-            options = ['gesture', '3d_object']
-            choice = messagebox.askquestion(
-                "Select Mode",
-                "Gesture Detection?\n\nYes = Gesture\nNo = 3D Object"
-            )
-            selected_mode = 'gesture' if choice == 'yes' else '3d_object'
+        selected_mode = self.record_mode_var.get()
         
         self.log("\n" + "="*50)
         self.log(f"📹 Recording video: {selected_mode}")
         self.log("="*50)
         
-        duration = self.duration_var.get()
-        cmd = [
-            sys.executable,
-            "vision_system_headless.py",
-            "--mode", selected_mode,
-            "--duration", duration,
-            "--save-video"
-        ]
+        duration = self._get_duration()
+        if duration is None:
+            return
+        command = {'op': 'run', 'mode': selected_mode, 'duration': duration, 'save_video': True}
         
-        self.run_process(cmd, f"Recording {selected_mode}")
+        self.run_worker_session(command, f"Recording {selected_mode}")
     
     def run_process(self, cmd, status_text):
         """Run a subprocess"""
@@ -340,57 +379,173 @@ class VisionControlCenter:
         self.stop_btn.config(state=tk.NORMAL)
         self.update_status(status_text, '#66bb6a')
         
-        def run():
-            try:
-                self.current_process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1
-                )
-                
-                # Read output
-                for line in self.current_process.stdout:
-                    if not self.running:
-                        break
+        self.process_task = self.loop.create_task(self._run_process(cmd))
+    
+    async def _run_process(self, cmd):
+        """Launch cmd and stream its output into the log until it exits"""
+        proc = None
+        try:
+            # The worker holds the camera; release it before starting another camera user
+            await self._shutdown_worker()
+            
+            # close_fds=False lets CPython start the child with posix_spawn instead
+            # of fork+exec; fds are non-inheritable by default (PEP 446), so
+            # nothing extra leaks. cmd[0] must stay an absolute path for the same reason.
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                close_fds=False
+            )
+            self.current_process = proc
+            
+            # Read output in large chunks and split lines here,
+            # carrying any unfinished trailing line over to the next chunk
+            residual = ""
+            while self.running:
+                chunk = await proc.stdout.read(65536)
+                if not chunk:
+                    break
+                lines = (residual + chunk.decode('utf-8', 'replace')).split("\n")
+                residual = lines.pop()
+                for line in lines:
                     self.log(line.rstrip())
-                
-                self.current_process.wait()
-                
-                if self.running:
-                    self.log("\n✅ Process completed")
-                    self.update_status("Completed", '#4fc3f7')
-                
-            except Exception as e:
-                self.log(f"\n❌ Error: {str(e)}")
-                self.update_status("Error", '#ff5252')
+            if residual and self.running:
+                self.log(residual.rstrip())
+            
+            await proc.wait()
             
-            finally:
+            if self.running:
+                self.log("\n✅ Process completed")
+                self.update_status("Completed", '#4fc3f7')
+            
+        except Exception as e:
+            self.log(f"\n❌ Error: {str(e)}")
+            self.update_status("Error", '#ff5252')
+        
+        finally:
+            # A newer launch may already own the UI state
+            if self.current_process is proc:
                 self.running = False
                 self.stop_btn.config(state=tk.DISABLED)
                 self.current_process = None
+    
+    def run_worker_session(self, command, status_text):
+        """Start a session in the long-lived vision worker"""
+        self.running = True
+        self._stopping = False
+        self.stop_btn.config(state=tk.NORMAL)
+        self.update_status(status_text, '#66bb6a')
+        
+        self.process_task = self.loop.create_task(self._run_worker_session(command))
+    
+    async def _run_worker_session(self, command):
+        """Send a session command, starting the worker first if needed"""
+        try:
+            if self._worker is None:
+                self.log("Starting vision worker (models are loaded once)...")
+                self._worker = await asyncio.create_subprocess_exec(
+                    *WORKER_CMD,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    close_fds=False
+                )
+                self.loop.create_task(self._read_worker(self._worker))
+            
+            await self._send_worker(command)
         
-        self.log_thread = threading.Thread(target=run, daemon=True)
-        self.log_thread.start()
+        except Exception as e:
+            self.log(f"\n❌ Error: {str(e)}")
+            self.update_status("Error", '#ff5252')
+            self._session_ended()
+    
+    async def _send_worker(self, command):
+        """Write one JSON command line to the worker"""
+        self._worker.stdin.write((json.dumps(command) + "\n").encode())
+        await self._worker.stdin.drain()
+    
+    async def _read_worker(self, worker):
+        """Stream worker output into the log and track session completion"""
+        residual = ""
+        while True:
+            chunk = await worker.stdout.read(65536)
+            if not chunk:
+                break
+            lines = (residual + chunk.decode('utf-8', 'replace')).split("\n")
+            residual = lines.pop()
+            for line in lines:
+                line = line.rstrip()
+                if line == SESSION_DONE:
+                    self._worker_session_done()
+                else:
+                    self.log(line)
+        
+        await worker.wait()
+        if self._worker is worker:
+            self._worker = None
+            # Worker died in the middle of a session
+            if self.running and self.current_process is None:
+                self.log(f"\n❌ Vision worker exited (code {worker.returncode})")
+                self.update_status("Error", '#ff5252')
+                self._session_ended()
+    
+    def _worker_session_done(self):
+        """Handle the end-of-session marker from the worker"""
+        if self._stopping:
+            self.update_status("Stopped", '#ff9800')
+        else:
+            self.log("\n✅ Process completed")
+            self.update_status("Completed", '#4fc3f7')
+        self._session_ended()
+    
+    def _session_ended(self):
+        """Reset UI state after a worker session"""
+        self._stopping = False
+        self.running = False
+        self.stop_btn.config(state=tk.DISABLED)
+    
+    async def _shutdown_worker(self):
+        """Ask the worker to release the camera and exit, and wait for it"""
+        worker = self._worker
+        if worker is None:
+            return
+        self.log("Releasing camera from vision worker...")
+        self._worker = None
+        try:
+            worker.stdin.write((json.dumps({'op': 'quit'}) + "\n").encode())
+            await worker.stdin.drain()
+        except ConnectionError:
+            pass
+        await worker.wait()
     
     def stop_process(self):
         """Stop running process"""
         if self.current_process:
             self.log("\n⏹ Stopping process...")
-            self.current_process.terminate()
+            if self.current_process.returncode is None:
+                self.current_process.terminate()
             self.running = False
             self.stop_btn.config(state=tk.DISABLED)
             self.update_status("Stopped", '#ff9800')
+        elif self.running and self._worker is not None:
+            # The session ends (and running clears) when the worker reports back
+            self.log("\n⏹ Stopping process...")
+            self._stopping = True
+            self.loop.create_task(self._send_worker({'op': 'stop'}))
+            self.stop_btn.config(state=tk.DISABLED)
+            self.update_status("Stopping...", '#ff9800')
     
     def on_closing(self):
         """Handle window close"""
         if self.running:
-            if messagebox.askokcancel("Quit", "Process is running. Stop and quit?"):
-                self.stop_process()
-                self.root.destroy()
-        else:
-            self.root.destroy()
+            if not messagebox.askokcancel("Quit", "Process is running. Stop and quit?"):
+                return
+            self.stop_process()
+        
+        if self._worker is not None and self._worker.returncode is None:
+            self._worker.terminate()
+        self.root.destroy()
 
 
 def main():
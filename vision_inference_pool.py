@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Vision Inference Pool
+Runs the face, gesture and 3D object detectors in separate processes
+
+Each detector gets its own worker process (so MediaPipe's Python glue never
+waits on the GIL held by another detector). Frames are shared through
+SharedMemory blocks instead of being pickled; only the detection lists travel
+back through queues. Drawing, recognition and servo tracking stay in the
+calling process.
+"""
+
+import importlib
+import multiprocessing
+import numpy as np
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+# Detector name -> (module, class, detection method)
+DETECTORS = {
+    'face': ('face_recognition_module', 'FaceRecognitionModule', 'detect_faces'),
+    'gesture': ('gesture_recognition_module', 'GestureRecognitionModule', 'detect_hands'),
+    '3d_object': ('object_3d_detection_module', 'Object3DDetectionModule', 'detect_objects'),
+}
+
+
+def _worker(name: str, options: dict, shm_name: str, shape: Tuple[int, int, int],
+            requests, results):
+    """Detector process: run detection on the shared frame for each request"""
+    module_name, class_name, method_name = DETECTORS[name]
+    module_class = getattr(importlib.import_module(module_name), class_name)
+    # No camera here: servo tracking is done by the parent process
+    detector = module_class(camera=None, enable_tracking=False, **options)
+    detect = getattr(detector, method_name)
+    
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray(shape, np.uint8, buffer=shm.buf)
+    try:
+        while True:
+            seq = requests.get()
+            if seq is None:
+                break
+            try:
+                results.put((seq, detect(frame)))
+            except Exception as e:
+                print(f"Error in {name} worker: {e}")
+                results.put((seq, []))
+    finally:
+        del frame  # Release the view before closing the mapping
+        shm.close()
+        detector.close()
+
+
+class InferencePool:
+    """One worker process per detector, each with its own shared frame buffer"""
+    
+    def __init__(self, frame_shape: Tuple[int, int, int],
+                 detectors: Dict[str, dict], timeout: float = 5.0):
+        """
+        Start the worker processes
+        
+        Args:
+            frame_shape: Shape of the BGR frames to process, (height, width, 3)
+            detectors: Detector name (see DETECTORS) -> constructor options
+            timeout: Seconds to wait for a worker's result before giving up
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.timeout = timeout
+        self._seq = 0
+        self._options = dict(detectors)
+        
+        # spawn: a forked child would inherit the parent's camera, I2C bus and threads
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = {}
+        # Detector name -> (seq, time) of a request that timed out; the worker
+        # may still be reading its buffer, so it gets no new frame until it answers
+        self._pending = {}
+        for name in detectors:
+            self._start_worker(name)
+        
+        print(f"Inference pool started ({', '.join(detectors)})")
+    
+    def _start_worker(self, name: str):
+        """Start (or restart) a detector's process with a fresh frame buffer"""
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.frame_shape)))
+        frame = np.ndarray(self.frame_shape, np.uint8, buffer=shm.buf)
+        requests = self._context.Queue()
+        results = self._context.Queue()
+        process = self._context.Process(
+            target=_worker,
+            args=(name, self._options[name], shm.name, self.frame_shape, requests, results),
+            daemon=True
+        )
+        process.start()
+        self._workers[name] = (process, requests, results, shm, frame)
+        self._pending.pop(name, None)
+    
+    def _stop_worker(self, name: str, wait: bool = True):
+        """Stop a detector's process and free its frame buffer"""
+        process, requests, _, shm, frame = self._workers.pop(name)
+        if wait and process.is_alive():
+            requests.put(None)
+            process.join(timeout=2.0)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=1.0)
+        del frame  # Release the view before closing the mapping
+        shm.close()
+        shm.unlink()
+    
+    def _is_free(self, name: str) -> bool:
+        """Check whether a worker can take a new frame, restarting it if it hung or died"""
+        pending = self._pending.get(name)
+        if pending is None:
+            return True
+        
+        seq, since = pending
+        process, _, results, _, _ = self._workers[name]
+        try:
+            while True:
+                if results.get_nowait()[0] == seq:
+                    del self._pending[name]
+                    return True
+        except queue.Empty:
+            pass
+        
+        if not process.is_alive() or time.monotonic() - since > 3 * self.timeout:
+            print(f"Warning: Restarting {name} worker")
+            self._stop_worker(name, wait=False)
+            self._start_worker(name)
+            return True
+        return False
+    
+    def detect(self, frame: np.ndarray, names=None) -> Dict[str, List]:
+        """
+        Run detectors on a frame in parallel and wait for all of them
+        
+        Args:
+            frame: BGR frame of frame_shape (copied into shared memory)
+            names: Detectors to run (default: all)
+        
+        Returns:
+            Detector name -> list of detections ([] on timeout or error, and
+            while a worker that timed out is still busy)
+        """
+        if names is None:
+            names = list(self._workers)
+        
+        # Only idle workers get the frame, so no buffer is overwritten while
+        # a late worker is still reading it
+        self._seq += 1
+        seq = self._seq
+        sent = [name for name in names if self._is_free(name)]
+        for name in sent:
+            _, requests, _, _, buffer = self._workers[name]
+            np.copyto(buffer, frame)
+            requests.put(seq)
+        
+        detections = {name: [] for name in names}
+        for name in sent:
+            results = self._workers[name][2]
+            try:
+                # Skip any leftover results of earlier requests
+                while True:
+                    result_seq, result = results.get(timeout=self.timeout)
+                    if result_seq == seq:
+                        detections[name] = result
+                        break
+            except queue.Empty:
+                # Worker too slow or gone
+                print(f"Warning: {name} worker did not answer")
+                self._pending[name] = (seq, time.monotonic())
+        return detections
+    
+    def close(self):
+        """Stop the workers and free their frame buffers"""
+        for name in list(self._workers):
+            self._stop_worker(name)
@@ -7,11 +7,14 @@ Unified demonstration of all vision capabilities
 
 import cv2
 import argparse
+import concurrent.futures
+import threading
+import time
 from camera_controller import CameraController
 from face_recognition_module import FaceRecognitionModule
 from gesture_recognition_module import GestureRecognitionModule
 from object_3d_detection_module import Object3DDetectionModule
-from vision_utils import FPSCounter, add_overlay_text
+from vision_utils import FPSCounter, OverlayCache
 
 
 class VisionSystemDemo:
@@ -25,7 +28,8 @@ class VisionSystemDemo:
     - all: All features combined
     """
     
-    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480):
+    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480,
+                 mode: str = 'face'):
         """Initialize vision system"""
         
         # Initialize camera
@@ -56,72 +60,126 @@ class VisionSystemDemo:
             enable_tracking=True
         )
         
+        # Worker pool for 'all' mode, reused across frames
+        self._all_pool = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+        
         # FPS counter
         self.fps_counter = FPSCounter()
         
         # Mode states
-        self.mode = 'face'
-        self.modes = ['face', 'gesture', '3d_object', 'all']
+        self.modes = ('face', 'gesture', '3d_object', 'all')
+        self._mode_idx = self.modes.index(mode)
+        self.mode = mode
+        self._running = False
+        
+        # Pre-rendered info overlays (re-rendered only for new lines)
+        self._info_overlays = OverlayCache(font_scale=0.5, line_spacing=25)
+        
+        # Latest-only mailbox from the inference thread to the display loop:
+        # the slot is overwritten in place, so unseen frames are simply dropped
+        self._display_slot = [None]
+        self._frame_ready = threading.Event()
+        
+        # Dispatch tables for the main loop: mode -> frame handler,
+        # key -> action (global keys, then keys that only apply in one mode)
+        self._mode_handlers = {
+            'face': self.run_face_mode,
+            'gesture': self.run_gesture_mode,
+            '3d_object': self.run_3d_object_mode,
+            'all': self.run_all_mode,
+        }
+        self._key_handlers = {
+            ord('q'): self._quit,
+            ord('m'): self._cycle_mode,
+            ord('r'): self._reset_servos,
+            ord('t'): lambda frame: self.test_camera(),
+        }
+        self._mode_key_handlers = {
+            'face': {ord('a'): self._add_face},
+            '3d_object': {
+                ord('1'): lambda frame: self.object_3d_module.change_object_type('SHOE'),
+                ord('2'): lambda frame: self.object_3d_module.change_object_type('CHAIR'),
+                ord('3'): lambda frame: self.object_3d_module.change_object_type('CUP'),
+                ord('4'): lambda frame: self.object_3d_module.change_object_type('CAMERA'),
+            },
+        }
         
         print("Vision System initialized successfully!")
     
     def run_face_mode(self, frame):
         """Run face detection and recognition"""
-        self.face_module.process_frame(frame, recognize=True, track=True)
+        fm = self.face_module
+        fm.process_frame(frame, recognize=True, track=True)
         
-        info = [
+        info = (
             "MODE: Face Recognition",
-            f"Faces detected: {len(self.face_module.last_detections)}",
-            f"Database: {len(self.face_module.face_database)} faces",
+            f"Faces detected: {len(fm.last_detections)}",
+            f"Database: {len(fm.face_database)} faces",
             "",
             "Press 'a' to add face to database"
-        ]
+        )
         
         return frame, info
     
     def run_gesture_mode(self, frame):
         """Run gesture recognition"""
-        self.gesture_module.process_frame(frame, track=True)
+        gm = self.gesture_module
+        gm.process_frame(frame, track=True)
+        dets = gm.last_detections
         
-        info = [
+        info = (
             "MODE: Gesture Recognition",
-            f"Hands detected: {len(self.gesture_module.last_detections)}"
-        ]
+            f"Hands detected: {len(dets)}"
+        )
         
         # Add gesture info
-        for i, hand in enumerate(self.gesture_module.last_detections):
-            info.append(f"Hand {i+1}: {hand['gesture']}")
+        info += tuple(f"Hand {i+1}: {hand.gesture}" for i, hand in enumerate(dets))
         
         return frame, info
     
     def run_3d_object_mode(self, frame):
         """Run 3D object detection"""
-        self.object_3d_module.process_frame(frame, track=True)
+        o3 = self.object_3d_module
+        o3.process_frame(frame, track=True)
         
-        info = [
+        info = (
             "MODE: 3D Object Detection",
-            f"Object type: {self.object_3d_module.OBJECT_TYPES[self.object_3d_module.object_type_key]}",
-            f"Detected: {len(self.object_3d_module.last_detections)}",
+            f"Object type: {o3.OBJECT_TYPES[o3.object_type_key]}",
+            f"Detected: {len(o3.last_detections)}",
             "",
             "Press 1-4 to change object type:",
             "1=Shoe, 2=Chair, 3=Cup, 4=Camera"
-        ]
+        )
         
         return frame, info
     
     def run_all_mode(self, frame):
         """Run all detection modes simultaneously"""
-        # Disable tracking for individual modules to avoid conflicts
-        self.face_module.process_frame(frame, recognize=True, track=False)
-        self.gesture_module.process_frame(frame, track=False)
-        self.object_3d_module.process_frame(frame, track=False)
+        fm, gm, o3 = self.face_module, self.gesture_module, self.object_3d_module
         
-        info = [
-            "MODE: All Features",
-            f"Faces: {len(self.face_module.last_detections)}",
-            f"Hands: {len(self.gesture_module.last_detections)}",
-            f"3D Objects: {len(self.object_3d_module.last_detections)}"
+        # Inference only reads the frame, so the three models run concurrently
+        # (each releases the GIL inside MediaPipe). Tracking is disabled for
+        # individual modules to avoid conflicts.
+        pool = self._all_pool
+        futures = [
+            pool.submit(fm.process_frame, frame, recognize=True, track=False, draw=False),
+            pool.submit(gm.process_frame, frame, track=False, draw=False),
+            pool.submit(o3.process_frame, frame, track=False, draw=False),
         ]
+        for future in futures:
+            future.result()
+        
+        # Annotate serially afterwards so overlay order stays fixed
+        fm.draw_detections(frame, recognize=True)
+        gm.draw_detections(frame)
+        o3.draw_detections(frame)
+        
+        info = (
+            "MODE: All Features",
+            f"Faces: {len(fm.last_detections)}",
+            f"Hands: {len(gm.last_detections)}",
+            f"3D Objects: {len(o3.last_detections)}"
+        )
         
         return frame, info
     
@@ -139,71 +197,104 @@ class VisionSystemDemo:
         print("  't' - Test camera")
         print("="*50 + "\n")
         
+        key_handlers = self._key_handlers
+        mode_key_handlers = self._mode_key_handlers
+        display_slot = self._display_slot
+        frame_ready = self._frame_ready
+        # pollKey returns immediately instead of blocking for 1 ms (OpenCV >= 4.5.3)
+        poll_key = getattr(cv2, 'pollKey', lambda: cv2.waitKey(1))
+        
+        # Inference runs on its own thread; this (main) thread owns every HighGUI
+        # call and key handler, and just shows the newest processed frame
+        self._running = True
+        inference_thread = threading.Thread(target=self._inference_loop, daemon=True)
+        inference_thread.start()
+        
+        frame = None
         try:
-            while True:
-                # Read frame
-                ret, frame = self.camera.read()
-                if not ret or frame is None:
-                    continue
-                
-                # Process based on mode
-                if self.mode == 'face':
-                    frame, info = self.run_face_mode(frame)
-                elif self.mode == 'gesture':
-                    frame, info = self.run_gesture_mode(frame)
-                elif self.mode == '3d_object':
-                    frame, info = self.run_3d_object_mode(frame)
-                elif self.mode == 'all':
-                    frame, info = self.run_all_mode(frame)
-                
-                # Display FPS
-                fps = self.fps_counter.update()
-                self.fps_counter.draw_fps(frame, fps)
-                
-                # Display info
-                add_overlay_text(frame, info, position=(10, 60), font_scale=0.5, line_spacing=25)
-                
-                # Display frame
-                cv2.imshow("Vision System Demo", frame)
+            while self._running:
+                if frame_ready.wait(timeout=0.01):
+                    frame_ready.clear()
+                    frame, info, fps = display_slot[0]
+                    
+                    # Display FPS
+                    self.fps_counter.draw_fps(frame, fps)
+                    
+                    # Display info
+                    self._info_overlays.draw(frame, info, position=(10, 60))
+                    
+                    # Display frame
+                    cv2.imshow("Vision System Demo", frame)
                 
                 # Handle keyboard input
-                key = cv2.waitKey(1) & 0xFF
-                
-                if key == ord('q'):
-                    break
-                elif key == ord('m'):
-                    # Switch mode
-                    current_idx = self.modes.index(self.mode)
-                    self.mode = self.modes[(current_idx + 1) % len(self.modes)]
-                    print(f"Switched to mode: {self.mode}")
-                    self.camera.reset_servos()
-                elif key == ord('r'):
-                    self.camera.reset_servos()
-                    print("Camera servos reset")
-                elif key == ord('a') and self.mode == 'face':
-                    # Add face to database
-                    if len(self.face_module.last_detections) > 0:
-                        print("\nEnter name for this face: ", end='', flush=True)
-                        name = input()
-                        face = self.face_module.last_detections[self.face_module.tracked_face_idx]
-                        self.face_module.add_face(frame, face['bbox'], name)
-                elif key == ord('1') and self.mode == '3d_object':
-                    self.object_3d_module.change_object_type('SHOE')
-                elif key == ord('2') and self.mode == '3d_object':
-                    self.object_3d_module.change_object_type('CHAIR')
-                elif key == ord('3') and self.mode == '3d_object':
-                    self.object_3d_module.change_object_type('CUP')
-                elif key == ord('4') and self.mode == '3d_object':
-                    self.object_3d_module.change_object_type('CAMERA')
-                elif key == ord('t'):
-                    self.test_camera()
+                key = poll_key()
+                if key != -1:
+                    key &= 0xFF
+                    handler = key_handlers.get(key)
+                    if handler is None:
+                        handler = mode_key_handlers.get(self.mode, {}).get(key)
+                    if handler is not None:
+                        handler(frame)
         
         except KeyboardInterrupt:
             print("\nInterrupted by user")
         
         finally:
+            self._running = False
+            inference_thread.join(timeout=2.0)
             self.cleanup()
     
+    def _inference_loop(self):
+        """Run the current mode on each new camera frame and publish the result"""
+        mode_handlers = self._mode_handlers
+        display_slot = self._display_slot
+        frame_ready = self._frame_ready
+        last_frame_id = 0
+        
+        try:
+            while self._running:
+                # Read the newest frame; skip the iteration rather than
+                # re-running inference on a frame that was already processed
+                last_frame_id, frame = self.camera.read_new(last_frame_id)
+                if frame is None:
+                    time.sleep(0.002)
+                    continue
+                
+                # Process based on mode
+                frame, info = mode_handlers[self.mode](frame)
+                fps = self.fps_counter.update()
+                
+                display_slot[0] = (frame, info, fps)
+                frame_ready.set()
+        
+        except Exception as e:
+            print(f"Error in inference loop: {e}")
+            self._running = False
+    
+    def _quit(self, frame):
+        """Leave the main loop"""
+        self._running = False
+    
+    def _cycle_mode(self, frame):
+        """Switch to the next mode"""
+        self._mode_idx = (self._mode_idx + 1) % len(self.modes)
+        self.mode = self.modes[self._mode_idx]
+        print(f"Switched to mode: {self.mode}")
+        self.camera.reset_servos()
+    
+    def _reset_servos(self, frame):
+        """Reset camera servos"""
+        self.camera.reset_servos()
+        print("Camera servos reset")
+    
+    def _add_face(self, frame):
+        """Add the tracked face to the database (face mode)"""
+        if frame is not None and len(self.face_module.last_detections) > 0:
+            print("\nEnter name for this face: ", end='', flush=True)
+            name = input()
+            face = self.face_module.last_detections[self.face_module.tracked_face_idx]
+            self.face_module.add_face(frame, face.bbox, name)
+    
     def test_camera(self):
         """Test camera connection"""
         print("\nCamera Test:")
@@ -214,6 +305,7 @@ class VisionSystemDemo:
     def cleanup(self):
         """Cleanup resources"""
         print("\nCleaning up...")
+        self._all_pool.shutdown(wait=True)
         self.face_module.close()
         self.gesture_module.close()
         self.object_3d_module.close()
@@ -258,8 +350,8 @@ def main():
         return
     
     # Run demo
-    demo = VisionSystemDemo(camera_id=args.camera, width=args.width, height=args.height)
-    demo.mode = args.mode
+    demo = VisionSystemDemo(camera_id=args.camera, width=args.width, height=args.height,
+                            mode=args.mode)
     demo.run()
 
 
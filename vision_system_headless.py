@@ -9,11 +9,17 @@ Saves frames to files and prints detection info to console
 import cv2
 import time
 import argparse
+import threading
 from camera_controller import CameraController
 from face_recognition_module import FaceRecognitionModule
 from gesture_recognition_module import GestureRecognitionModule
 from object_3d_detection_module import Object3DDetectionModule
-from vision_utils import FPSCounter
+from vision_utils import (FPSCounter, FramePacer, CudaVideoWriter, FFmpegVideoWriter,
+                          ThreadedVideoWriter, render_text_overlay, blit_overlay,
+                          frame_signature, frames_differ, configure_cpu)
+
+# Snapshot JPEG settings: slightly lower quality, optimized Huffman tables
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
 
 
 class VisionSystemHeadless:
@@ -22,6 +28,9 @@ class VisionSystemHeadless:
     def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480):
         """Initialize vision system"""
         
+        # Before any OpenCV work, so its thread pool starts out sized for the fast cores
+        configure_cpu()
+        
         print("Initializing camera...")
         self.camera = CameraController(
             camera_id=camera_id,
@@ -48,11 +57,36 @@ class VisionSystemHeadless:
             enable_tracking=True
         )
         
+        # mode -> (process, module, label, noun, line formatter), looked up once per run
+        self._mode_table = {
+            'face': (
+                lambda frame: self.face_module.process_frame(frame, recognize=True, track=True, draw=True),
+                self.face_module,
+                "Face", "face(s)",
+                lambda i, face: f"  Face {i+1}: confidence={face.confidence:.2f}, center={face.center}"
+            ),
+            'gesture': (
+                lambda frame: self.gesture_module.process_frame(frame, track=True, draw=True),
+                self.gesture_module,
+                "Gesture", "hand(s)",
+                lambda i, hand: f"  Hand {i+1}: {hand.gesture} ({hand.handedness})"
+            ),
+            '3d_object': (
+                lambda frame: self.object_3d_module.process_frame(frame, track=True, draw=True),
+                self.object_3d_module,
+                "3D Object", "object(s)",
+                lambda i, obj: f"  Object {i+1}: {obj.object_type}, depth={obj.estimated_depth:.1f}"
+            ),
+        }
+        
         self.fps_counter = FPSCounter()
         self.mode = 'face'
         self.frame_count = 0
         self.video_writer = None
         
+        # Set by stop() to end the current run() early
+        self.stop_event = threading.Event()
+        
         print("Vision System initialized!")
     
     def run(self, duration: int = 60, save_interval: int = 5, save_video: bool = False, video_filename: str = None):
@@ -66,6 +100,8 @@ class VisionSystemHeadless:
             video_filename: Output video filename (auto-generated if None)
         """
         print(f"\nRunning in {self.mode} mode for {duration} seconds...")
+        self.frame_count = 0
+        fps = 0.0
         
         # Setup video writer if requested
         if save_video:
@@ -73,14 +109,27 @@ class VisionSystemHeadless:
                 timestamp = time.strftime("%Y%m%d_%H%M%S")
                 video_filename = f"vision_{self.mode}_{timestamp}.mp4"
             
-            # Try H264 codec first (better compression), fall back to MJPEG
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.video_writer = cv2.VideoWriter(
+            # Prefer H.264 on an NVIDIA GPU (Jetson), then through ffmpeg (hardware
+            # encoder where available), then OpenCV's mp4v, then MJPEG in an AVI
+            self.video_writer = CudaVideoWriter(
                 video_filename,
-                fourcc,
                 10.0,  # FPS for video file
                 (self.camera.width, self.camera.height)
             )
+            if not self.video_writer.isOpened():
+                self.video_writer = FFmpegVideoWriter(
+                    video_filename,
+                    10.0,
+                    (self.camera.width, self.camera.height)
+                )
+            if not self.video_writer.isOpened():
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                self.video_writer = cv2.VideoWriter(
+                    video_filename,
+                    fourcc,
+                    10.0,
+                    (self.camera.width, self.camera.height)
+                )
             
             if self.video_writer.isOpened():
                 print(f"📹 Recording video to: {video_filename}")
@@ -100,80 +149,84 @@ class VisionSystemHeadless:
                     print("❌ Failed to initialize video writer")
                     self.video_writer = None
                     save_video = False
+            
+            # Encode on a background thread so the vision loop never waits on it
+            # (the loop reuses one frame buffer, so queued frames must be copies)
+            if self.video_writer is not None:
+                self.video_writer = ThreadedVideoWriter(self.video_writer)
         
         print("Press Ctrl+C to stop\n")
         
         start_time = time.time()
         last_save = 0
-        last_print = 0
+        last_signature = None
+        frame = None  # Reused by read_into every iteration
+        target_fps = 20
+        pacer = FramePacer(target_fps=target_fps)
+        pacer.reset()
+        
+        # Resolve the mode once instead of branching on it every frame
+        process, module, label, noun, format_line = self._mode_table[self.mode]
+        next_print = time.monotonic()
+        
+        # The mode is fixed for the whole run, so rasterize its label once
+        mode_overlay = render_text_overlay([f"Mode: {self.mode.upper()}"], font_scale=0.7, thickness=2)
         
         try:
-            while (time.time() - start_time) < duration:
-                ret, frame = self.camera.read()
-                if not ret or frame is None:
+            while (time.time() - start_time) < duration and not self.stop_event.is_set():
+                ret, frame = self.camera.read_into(frame)
+                if not ret:
                     continue
                 
                 self.frame_count += 1
                 
-                # Process based on mode
-                if self.mode == 'face':
-                    self.face_module.process_frame(frame, recognize=True, track=True, draw=True)
-                    detections = self.face_module.last_detections
-                    
-                    # Print detections every 2 seconds to avoid spam
-                    if detections and (time.time() - last_print) >= 2.0:
-                        print(f"[Face] Detected {len(detections)} face(s)")
-                        for i, face in enumerate(detections):
-                            print(f"  Face {i+1}: confidence={face['confidence']:.2f}, center={face['center']}")
-                        last_print = time.time()
+                # Fingerprint the raw frame before annotations are drawn on it,
+                # but only when a snapshot is due
+                signature = None
+                if not save_video:
+                    elapsed = time.time() - start_time
+                    if elapsed - last_save >= save_interval:
+                        signature = frame_signature(frame)
                 
-                elif self.mode == 'gesture':
-                    self.gesture_module.process_frame(frame, track=True, draw=True)
-                    detections = self.gesture_module.last_detections
-                    
-                    if detections and (time.time() - last_print) >= 2.0:
-                        print(f"[Gesture] Detected {len(detections)} hand(s)")
-                        for i, hand in enumerate(detections):
-                            print(f"  Hand {i+1}: {hand['gesture']} ({hand['handedness']})")
-                        last_print = time.time()
+                # Process based on mode
+                process(frame)
+                detections = module.last_detections
                 
-                elif self.mode == '3d_object':
-                    self.object_3d_module.process_frame(frame, track=True, draw=True)
-                    detections = self.object_3d_module.last_detections
-                    
-                    if detections and (time.time() - last_print) >= 2.0:
-                        print(f"[3D Object] Detected {len(detections)} object(s)")
-                        for i, obj in enumerate(detections):
-                            print(f"  Object {i+1}: {obj['object_type']}, depth={obj['estimated_depth']:.1f}")
-                        last_print = time.time()
+                # Print detections at most every 2 seconds to avoid spam
+                if detections and time.monotonic() >= next_print:
+                    print(f"[{label}] Detected {len(detections)} {noun}")
+                    for i, det in enumerate(detections):
+                        print(format_line(i, det))
+                    next_print = time.monotonic() + 2.0
                 
                 # Calculate FPS and add to frame
                 fps = self.fps_counter.update()
                 self.fps_counter.draw_fps(frame, fps)
                 
                 # Add mode label to frame
-                cv2.putText(frame, f"Mode: {self.mode.upper()}", (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                blit_overlay(frame, mode_overlay, (10, 30))
                 
                 # Write to video file
                 if save_video and self.video_writer is not None:
                     self.video_writer.write(frame)
                 
-                # Save snapshot frames periodically (if not recording video)
-                elif not save_video:
-                    elapsed = time.time() - start_time
-                    if elapsed - last_save >= save_interval:
+                # Save snapshot frames periodically (if not recording video),
+                # skipping the encode when the scene hasn't changed since the last one
+                elif signature is not None:
+                    if frames_differ(signature, last_signature):
                         filename = f"vision_frame_{int(elapsed)}s.jpg"
-                        cv2.imwrite(filename, frame)
+                        cv2.imwrite(filename, frame, JPEG_PARAMS)
                         print(f"\n[SAVED] Frame saved to {filename} (FPS: {fps:.1f})")
                         
                         # Print servo positions
                         pan, tilt = self.camera.get_servo_angles()
                         print(f"[SERVO] Pan: {pan}°, Tilt: {tilt}°\n")
                         
-                        last_save = elapsed
+                        last_signature = signature
+                    
+                    last_save = elapsed
                 
-                time.sleep(0.05)  # Reduce CPU usage
+                pacer.wait()  # Cap at target_fps to reduce CPU usage
             
             # Print final statistics
             print(f"\n{'='*50}")
@@ -190,14 +243,23 @@ class VisionSystemHeadless:
                 print(f"Video saved to: {video_filename}")
         
         finally:
-            self.cleanup()
+            self._release_video_writer()
     
-    def cleanup(self):
-        """Cleanup resources"""
-        print("\nCleaning up...")
+    def stop(self):
+        """Ask the current run() to finish early (safe to call from another thread)"""
+        self.stop_event.set()
+    
+    def _release_video_writer(self):
+        """Finalize the video file of the last run, if any"""
         if self.video_writer is not None:
             self.video_writer.release()
+            self.video_writer = None
             print("Video writer released")
+    
+    def cleanup(self):
+        """Cleanup resources"""
+        print("\nCleaning up...")
+        self._release_video_writer()
         self.face_module.close()
         self.gesture_module.close()
         self.object_3d_module.close()
@@ -226,12 +288,15 @@ def main():
     
     system = VisionSystemHeadless(camera_id=args.camera, width=args.width, height=args.height)
     system.mode = args.mode
-    system.run(
-        duration=args.duration, 
-        save_interval=args.save_interval,
-        save_video=args.save_video,
-        video_filename=args.output
-    )
+    try:
+        system.run(
+            duration=args.duration, 
+            save_interval=args.save_interval,
+            save_video=args.save_video,
+            video_filename=args.output
+        )
+    finally:
+        system.cleanup()
 
 
 if __name__ == "__main__":
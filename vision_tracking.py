@@ -5,11 +5,14 @@ Vision Tracking Integration
 Integrates vision modules with robot movement and control
 """
 
+import cv2
 import time
+import numpy as np
 from typing import Optional
 from camera_controller import CameraController
 from face_recognition_module import FaceRecognitionModule
 from gesture_recognition_module import GestureRecognitionModule
+from vision_utils import FramePacer
 from Raspbot_Lib import Raspbot
 
 
@@ -36,58 +39,82 @@ class VisionTracker:
         self.base_speed = 100
         self.turn_speed = 80
         
+        # Face following detects on a half-size frame; centring only needs a few pixels
+        self.face_detect_scale = 2
+        self._small_buf = None
+        
+        # Last (dir, speed) written to each motor, see set_all_motors
+        self._last_state = None
+        
+        # Gesture -> action for gesture control; POINTING also needs the hand
+        # position and unknown gestures stop the robot (see gesture_control_mode)
+        self._gesture_actions = {
+            "OPEN_PALM": self.stop_motors,
+            "FIST": self.stop_motors,
+            "THUMBS_UP": self.move_forward,
+            "THUMBS_DOWN": self.move_backward,
+            "PEACE": self._spin,
+        }
+        
         # Control state
         self.is_running = True
         self.mode = 'idle'  # idle, face_following, gesture_control
         
         print("Vision Tracker initialized")
     
+    def set_all_motors(self, d0: int, s0: int, d1: int, s1: int,
+                       d2: int, s2: int, d3: int, s3: int):
+        """
+        Set direction and speed of all four motors (L1, L2, R1, R2)
+        
+        The HAT only takes one motor per register write, so this still costs
+        four writes; they are skipped entirely when the state is unchanged.
+        """
+        state = (d0, s0, d1, s1, d2, s2, d3, s3)
+        if state == self._last_state:
+            return
+        
+        # Forget the cached state if a write fails partway through
+        self._last_state = None
+        self.robot.Ctrl_Car(0, d0, s0)  # L1
+        self.robot.Ctrl_Car(1, d1, s1)  # L2
+        self.robot.Ctrl_Car(2, d2, s2)  # R1
+        self.robot.Ctrl_Car(3, d3, s3)  # R2
+        self._last_state = state
+    
     def stop_motors(self):
         """Stop all motors"""
-        self.robot.Ctrl_Car(0, 0, 0)  # L1
-        self.robot.Ctrl_Car(1, 0, 0)  # L2
-        self.robot.Ctrl_Car(2, 0, 0)  # R1
-        self.robot.Ctrl_Car(3, 0, 0)  # R2
+        self.set_all_motors(0, 0, 0, 0, 0, 0, 0, 0)
     
     def move_forward(self, speed: int = None):
         """Move robot forward"""
         if speed is None:
             speed = self.base_speed
         
-        self.robot.Ctrl_Car(0, 0, speed)  # L1 forward
-        self.robot.Ctrl_Car(1, 0, speed)  # L2 forward
-        self.robot.Ctrl_Car(2, 0, speed)  # R1 forward
-        self.robot.Ctrl_Car(3, 0, speed)  # R2 forward
+        self.set_all_motors(0, speed, 0, speed, 0, speed, 0, speed)
     
     def move_backward(self, speed: int = None):
         """Move robot backward"""
         if speed is None:
             speed = self.base_speed
         
-        self.robot.Ctrl_Car(0, 1, speed)  # L1 backward
-        self.robot.Ctrl_Car(1, 1, speed)  # L2 backward
-        self.robot.Ctrl_Car(2, 1, speed)  # R1 backward
-        self.robot.Ctrl_Car(3, 1, speed)  # R2 backward
+        self.set_all_motors(1, speed, 1, speed, 1, speed, 1, speed)
     
     def turn_left(self, speed: int = None):
         """Turn robot left"""
         if speed is None:
             speed = self.turn_speed
         
-        self.robot.Ctrl_Car(0, 1, speed)  # L1 backward
-        self.robot.Ctrl_Car(1, 1, speed)  # L2 backward
-        self.robot.Ctrl_Car(2, 0, speed)  # R1 forward
-        self.robot.Ctrl_Car(3, 0, speed)  # R2 forward
+        # Left wheels backward, right wheels forward
+        self.set_all_motors(1, speed, 1, speed, 0, speed, 0, speed)
     
     def turn_right(self, speed: int = None):
         """Turn robot right"""
         if speed is None:
             speed = self.turn_speed
         
-        self.robot.Ctrl_Car(0, 0, speed)  # L1 forward
-        self.robot.Ctrl_Car(1, 0, speed)  # L2 forward
-        self.robot.Ctrl_Car(2, 1, speed)  # R1 backward
-        self.robot.Ctrl_Car(3, 1, speed)  # R2 backward
+        # Left wheels forward, right wheels backward
+        self.set_all_motors(0, speed, 0, speed, 1, speed, 1, speed)
     
     def face_following_mode(self, frame):
         """
@@ -95,18 +122,23 @@ class VisionTracker:
         
         Robot turns to keep face centered and maintains distance
         """
-        # Detect faces
-        faces = self.face_module.detect_faces(frame)
+        # Detect faces on a downscaled copy (preallocated, reused every frame)
+        scale = self.face_detect_scale
+        h, w = frame.shape[:2]
+        self._small_buf = cv2.resize(frame, (w // scale, h // scale), dst=self._small_buf,
+                                     interpolation=cv2.INTER_AREA)
+        faces = self.face_module.detect_faces(self._small_buf)
         
         if len(faces) == 0:
             # No face detected, stop
             self.stop_motors()
             return
         
-        # Track first face
-        face = faces[0]
-        cx, cy = face['center']
-        bbox = face['bbox']
+        # Track the most confident face, mapped back to full-frame coordinates
+        soa = self.face_module.last_detections_soa
+        best = int(np.argmax(soa['confidences']))
+        cx, cy = (soa['centers'][best] * scale).tolist()
+        bbox = (soa['bboxes'][best] * scale).tolist()
         
         # Get frame dimensions
         frame_width = self.camera.width
@@ -163,38 +195,29 @@ class VisionTracker:
             return
         
         # Get first hand gesture
-        gesture = hands[0]['gesture']
-        handedness = hands[0]['handedness']
+        gesture = hands[0].gesture
+        handedness = hands[0].handedness
         
         print(f"Gesture: {gesture}")
         
         # Execute command based on gesture
-        if gesture == "OPEN_PALM" or gesture == "FIST":
-            self.stop_motors()
-        
-        elif gesture == "THUMBS_UP":
-            self.move_forward()
-        
-        elif gesture == "THUMBS_DOWN":
-            self.move_backward()
-        
-        elif gesture == "POINTING":
-            # Determine direction from hand position
-            cx = hands[0]['center'][0]
-            if cx < self.camera.width // 2:
-                self.turn_left()
-            else:
-                self.turn_right()
-        
-        elif gesture == "PEACE":
-            # Special action: spin
-            self.turn_right(speed=100)
-            time.sleep(1)
-            self.stop_motors()
-        
+        if gesture == "POINTING":
+            self._turn_towards_hand(hands[0])
         else:
-            # Unknown gesture, stop
-            self.stop_motors()
+            self._gesture_actions.get(gesture, self.stop_motors)()
+    
+    def _turn_towards_hand(self, hand):
+        """Turn left/right depending on which half of the frame the hand is in"""
+        if hand.center[0] < self.camera.width // 2:
+            self.turn_left()
+        else:
+            self.turn_right()
+    
+    def _spin(self):
+        """Special action: spin"""
+        self.turn_right(speed=100)
+        time.sleep(1)
+        self.stop_motors()
     
     def run_face_following(self):
         """Run face following mode"""
@@ -202,15 +225,18 @@ class VisionTracker:
         print("Press Ctrl+C to stop")
         
         self.mode = 'face_following'
+        pacer = FramePacer(target_fps=20)
+        pacer.reset()
+        frame = None  # Reused by read_into every iteration
         
         try:
             while self.is_running:
-                ret, frame = self.camera.read()
-                if not ret or frame is None:
+                ret, frame = self.camera.read_into(frame)
+                if not ret:
                     continue
                 
                 self.face_following_mode(frame)
-                time.sleep(0.1)
+                pacer.wait()
         
         except KeyboardInterrupt:
             print("\nStopping...")
@@ -230,15 +256,18 @@ class VisionTracker:
         print("  PEACE: Spin")
         
         self.mode = 'gesture_control'
+        pacer = FramePacer(target_fps=10)
+        pacer.reset()
+        frame = None  # Reused by read_into every iteration
         
         try:
             while self.is_running:
-                ret, frame = self.camera.read()
-                if not ret or frame is None:
+                ret, frame = self.camera.read_into(frame)
+                if not ret:
                     continue
                 
                 self.gesture_control_mode(frame)
-                time.sleep(0.2)
+                pacer.wait()
         
         except KeyboardInterrupt:
             print("\nStopping...")
@@ -8,35 +8,174 @@ Provides helper functions for computer vision tasks including:
 - Coordinate transformations
 - Annotation drawing
 - Servo angle calculations for tracking
+- Video encoding through ffmpeg
+- JPEG encoding through libjpeg-turbo (simplejpeg) when available
+- Detection record types shared by the vision modules
+- OpenCV threading and CPU affinity setup
 """
 
 import cv2
+import functools
+import math
 import numpy as np
+import os
+import queue
+import shutil
+import subprocess
+import threading
 import time
-from typing import Tuple, List, Optional
+from collections import OrderedDict, deque
+from typing import Tuple, List, NamedTuple, Optional, Sequence
+
+# Optional: libjpeg-turbo bindings, faster than cv2.imencode (see encode_jpeg)
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+
+def performance_cores() -> List[int]:
+    """
+    Find the fastest CPU cores this process may run on
+    
+    On big.LITTLE boards (e.g. RK3588) these are the big cores; on boards with
+    identical cores (e.g. Raspberry Pi 5) it is every core.
+    
+    Returns:
+        Sorted list of CPU ids
+    """
+    try:
+        allowed = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+    
+    max_freqs = {}
+    for cpu in allowed:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/cpufreq/cpuinfo_max_freq") as f:
+                max_freqs[cpu] = int(f.read())
+        except (OSError, ValueError):
+            # No cpufreq information: treat all cores as equal
+            return allowed
+    
+    fastest = max(max_freqs.values())
+    return [cpu for cpu in allowed if max_freqs[cpu] == fastest]
+
+
+def configure_cpu(pin_to_performance_cores: bool = True) -> List[int]:
+    """
+    Enable OpenCV's optimized code paths and size its thread pool to the fast cores
+    
+    Args:
+        pin_to_performance_cores: Also restrict this process to those cores
+            (only has an effect on boards with mixed core types)
+    
+    Returns:
+        CPU ids OpenCV's thread pool was sized for
+    """
+    cv2.setUseOptimized(True)
+    cores = performance_cores()
+    cv2.setNumThreads(len(cores))
+    
+    if pin_to_performance_cores and hasattr(os, 'sched_setaffinity'):
+        if len(cores) < len(os.sched_getaffinity(0)):
+            try:
+                os.sched_setaffinity(0, cores)
+                print(f"Pinned to performance cores: {cores}")
+            except OSError as e:
+                print(f"Warning: Could not set CPU affinity: {e}")
+    
+    return cores
+
+
+class FaceDetection(NamedTuple):
+    """Face found by FaceRecognitionModule.detect_faces"""
+    bbox: Tuple[int, int, int, int]
+    confidence: float
+    center: Tuple[int, int]
+    landmarks: List[Tuple[int, int]]
+
+
+class HandDetection(NamedTuple):
+    """Hand found by GestureRecognitionModule.detect_hands"""
+    landmarks: List[Tuple[int, int, float]]
+    bbox: Tuple[int, int, int, int]
+    center: Tuple[int, int]
+    handedness: str
+    gesture: str
+
+
+class ObjectDetection(NamedTuple):
+    """Object found by Object3DDetectionModule.detect_objects"""
+    object_type: str
+    landmarks_2d: np.ndarray  # (N, 2) int32 pixel coordinates
+    landmarks_3d: np.ndarray  # (N, 3) float32
+    bbox: Tuple[int, int, int, int]
+    center: Tuple[int, int]
+    estimated_depth: float
+    rotation: Optional[object]
+    translation: Optional[object]
+
+
+def detections_to_soa(detections: list, label_field: Optional[str] = None) -> dict:
+    """
+    Convert a list of detection records into struct-of-arrays form
+    
+    Args:
+        detections: FaceDetection/HandDetection/ObjectDetection records
+        label_field: Record field to collect as labels (e.g. 'gesture')
+    
+    Returns:
+        Dict with 'centers' (N, 2) int32, 'bboxes' (N, 4) int32,
+        'confidences' (N,) float32 (1.0 for records without a confidence)
+        and 'labels' (list of str, empty if no label_field)
+    """
+    n = len(detections)
+    centers = np.empty((n, 2), np.int32)
+    bboxes = np.empty((n, 4), np.int32)
+    confidences = np.ones(n, np.float32)
+    has_confidence = n > 0 and 'confidence' in detections[0]._fields
+    
+    for i, det in enumerate(detections):
+        centers[i] = det.center
+        bboxes[i] = det.bbox
+        if has_confidence:
+            confidences[i] = det.confidence
+    
+    labels = [getattr(det, label_field) for det in detections] if label_field else []
+    
+    return {'centers': centers, 'bboxes': bboxes, 'confidences': confidences, 'labels': labels}
 
 
 class FPSCounter:
     """Calculate and display frames per second"""
     
-    def __init__(self, buffer_size: int = 30):
+    # Pre-rendered "FPS: " and digit tiles, shared by all counters (see draw_fps)
+    _glyphs = None
+    
+    def __init__(self, buffer_size: int = 30, window: float = 1.0):
         self.buffer_size = buffer_size
-        self.buffer_size = buffer_size # This buffer_size is no longer directly used for FPS calculation in the new update logic
-        self.frame_times = []
-        self.last_time = time.time() # This is no longer directly used for FPS calculation in the new update logic
+        # Ring buffer of perf_counter_ns() timestamps for the last buffer_size frames
+        self.frame_times = deque(maxlen=buffer_size)
+        # Timestamps older than this (seconds) are dropped so the rate reflects recent frames
+        self.window_ns = int(window * 1e9)
         self.fps = 0.0 # Initialize fps
     
     def update(self) -> float:
         """Update FPS counter and return current FPS"""
-        current_time = time.time()
-        self.frame_times.append(current_time)
+        frame_times = self.frame_times
+        now = time.perf_counter_ns()
+        frame_times.append(now)
         
-        # Keep only last second of frame times
-        cutoff_time = current_time - 1.0
-        self.frame_times = [t for t in self.frame_times if t > cutoff_time]
+        # Expire old timestamps from the front (always keep two for an interval)
+        cutoff = now - self.window_ns
+        while len(frame_times) > 2 and frame_times[0] < cutoff:
+            frame_times.popleft()
         
-        # Calculate FPS
-        self.fps = float(len(self.frame_times))
+        # Average over the frames currently in the window
+        elapsed_ns = frame_times[-1] - frame_times[0]
+        if elapsed_ns > 0:
+            self.fps = (len(frame_times) - 1) * 1e9 / elapsed_ns
         
         return self.fps
     
@@ -48,8 +187,83 @@ class FPSCounter:
         """Draw FPS on frame"""
         # Use the provided fps value or get the current one from the counter
         display_fps = fps if fps is not None else self.get_fps()
-        cv2.putText(frame, f"FPS: {display_fps:.1f}", position, 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
+        # Blit pre-rendered glyphs instead of rasterizing the text every frame
+        glyphs = FPSCounter._glyphs
+        if glyphs is None:
+            glyphs = FPSCounter._glyphs = self._build_glyphs()
+        if not glyphs:
+            cv2.putText(frame, f"FPS: {display_fps:.1f}", position,
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            return
+        
+        x, y = position
+        overlay, advance = glyphs["FPS: "]
+        blit_overlay(frame, overlay, (x, y))
+        x += advance
+        for ch in f"{display_fps:.1f}":
+            overlay, advance = glyphs[ch]
+            blit_overlay(frame, overlay, (x, y))
+            x += advance
+    
+    @staticmethod
+    def _build_glyphs() -> dict:
+        """
+        Render the FPS label and digit tiles once, with their advance widths
+        
+        Returns:
+            Text -> (overlay, advance), or {} if the tiles would not reproduce
+            cv2.putText exactly (draw_fps then falls back to putText)
+        """
+        # getTextSize widths include the stroke thickness, so measure the
+        # real advance as the growth of the text when a glyph is prepended
+        (zero_width, _), _ = get_text_size("0", 0.7, 2)
+        glyphs = {}
+        for text in ["FPS: ", "."] + [str(d) for d in range(10)]:
+            (width, _), _ = get_text_size(text + "0", 0.7, 2)
+            glyphs[text] = (render_text_overlay([text], font_scale=0.7, color=(0, 255, 0), thickness=2),
+                            width - zero_width)
+        
+        # Tiles sit on whole pixels, so they only match putText when the font's
+        # advances are whole pixels too; check every glyph once against putText
+        sample = "0123456789.9876543210"
+        expected = np.zeros((40, 400, 3), np.uint8)
+        cv2.putText(expected, "FPS: " + sample, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        actual = np.zeros_like(expected)
+        x = 10
+        for text in ["FPS: "] + list(sample):
+            overlay, advance = glyphs[text]
+            blit_overlay(actual, overlay, (x, 30))
+            x += advance
+        if not np.array_equal(actual, expected):
+            return {}
+        return glyphs
+
+
+class FramePacer:
+    """Hold a processing loop to a target rate with a monotonic deadline"""
+    
+    def __init__(self, target_fps: float):
+        self.period = 1.0 / target_fps
+        self.next_deadline = None
+    
+    def reset(self):
+        """Start the schedule from now (call before entering the loop)"""
+        self.next_deadline = time.monotonic()
+    
+    def wait(self):
+        """Sleep only for what is left of the current frame period"""
+        now = time.monotonic()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        
+        self.next_deadline += self.period
+        delay = self.next_deadline - now
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -self.period:
+            # Fell far behind (e.g. a slow frame); restart rather than burst to catch up
+            self.next_deadline = now
 
 
 class ServoTracker:
@@ -85,6 +299,10 @@ class ServoTracker:
         # Tracking parameters (adjusted for better face tracking)
         self.dead_zone = 0.15  # 15% dead zone in center (increased for stability)
         self.max_step = 8  # Maximum angle change per update (increased for faster response)
+        
+        # Precomputed so normalization is a multiply: norm = x * (2 / width) - 1
+        self.inv_half_w = 2.0 / frame_width
+        self.inv_half_h = 2.0 / frame_height
     
     def calculate_servo_angles(self, x: int, y: int, 
                                smooth: bool = True) -> Tuple[int, int]:
@@ -100,33 +318,34 @@ class ServoTracker:
             Tuple of (pan_angle, tilt_angle)
         """
         # Normalize coordinates to [-1, 1]
-        norm_x = (x - self.frame_width / 2) / (self.frame_width / 2)
-        norm_y = (y - self.frame_height / 2) / (self.frame_height / 2)
+        norm_x = x * self.inv_half_w - 1.0
+        norm_y = y * self.inv_half_h - 1.0
         
         # Apply dead zone
-        if abs(norm_x) < self.dead_zone:
-            norm_x = 0
-        if abs(norm_y) < self.dead_zone:
-            norm_y = 0
+        dead_zone = self.dead_zone
+        if abs(norm_x) < dead_zone:
+            norm_x = 0.0
+        if abs(norm_y) < dead_zone:
+            norm_y = 0.0
         
         # Calculate target angles (adjusted for better tracking)
         pan_delta = -norm_x * 40  # Max 40 degree adjustment (increased range)
         tilt_delta = norm_y * 25  # Max 25 degree adjustment (increased range)
         
+        # Apply smoothing (plain scalar clamps; np.clip on Python floats is far slower)
+        if smooth:
+            max_step = self.max_step
+            pan_delta = max(-max_step, min(max_step, pan_delta))
+            tilt_delta = max(-max_step, min(max_step, tilt_delta))
+        
         target_pan = self.current_pan + pan_delta
         target_tilt = self.current_tilt + tilt_delta
         
-        # Apply smoothing
-        if smooth:
-            pan_delta = np.clip(target_pan - self.current_pan, -self.max_step, self.max_step)
-            tilt_delta = np.clip(target_tilt - self.current_tilt, -self.max_step, self.max_step)
-            
-            target_pan = self.current_pan + pan_delta
-            target_tilt = self.current_tilt + tilt_delta
-        
         # Clamp to valid ranges
-        target_pan = np.clip(target_pan, self.pan_range[0], self.pan_range[1])
-        target_tilt = np.clip(target_tilt, self.tilt_range[0], self.tilt_range[1])
+        pan_min, pan_max = self.pan_range
+        tilt_min, tilt_max = self.tilt_range
+        target_pan = max(pan_min, min(pan_max, target_pan))
+        target_tilt = max(tilt_min, min(tilt_max, target_tilt))
         
         # Update current positions
         self.current_pan = int(target_pan)
@@ -141,6 +360,37 @@ class ServoTracker:
         return self.current_pan, self.current_tilt
 
 
+# Frame buffer ownership
+# ----------------------
+# The per-frame path (camera read -> preprocess -> detect -> draw -> write) is
+# memory-bound on Pi-class boards, so a frame is one buffer for its whole life:
+# - draw_bounding_box, draw_landmarks, draw_connections, add_overlay_text,
+#   blit_overlay and FPSCounter.draw_fps draw in place and never copy
+# - preprocess_frame returns the input itself when there is nothing to do and
+#   otherwise writes into the caller's out buffer when one is given
+# - the vision modules' process_frame annotate the frame they are given
+# Only copy where the pipeline forks or hands a frame to another thread that
+# outlives the caller's buffer (CameraController.read_into, ThreadedVideoWriter).
+
+
+@functools.lru_cache(maxsize=512)
+def get_text_size(text: str, font_scale: float, thickness: int,
+                  font: int = cv2.FONT_HERSHEY_SIMPLEX) -> Tuple[Tuple[int, int], int]:
+    """
+    Cached cv2.getTextSize (labels repeat from frame to frame)
+    
+    Args:
+        text: Text to measure
+        font_scale: Font size scale
+        thickness: Text thickness
+        font: OpenCV font face
+    
+    Returns:
+        ((width, height), baseline) as returned by cv2.getTextSize
+    """
+    return cv2.getTextSize(text, font, font_scale, thickness)
+
+
 def draw_bounding_box(frame: np.ndarray, 
                       bbox: Tuple[int, int, int, int],
                       label: str = "",
@@ -163,7 +413,7 @@ def draw_bounding_box(frame: np.ndarray,
     
     # Draw label if provided
     if label:
-        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        label_size, _ = get_text_size(label, 0.6, 2)
         label_w, label_h = label_size
         
         # Draw label background
@@ -187,8 +437,13 @@ def draw_landmarks(frame: np.ndarray,
         color: Point color in BGR
         radius: Point radius
     """
-    for point in landmarks:
-        cv2.circle(frame, point, radius, color, -1)
+    if len(landmarks) == 0:
+        return
+    
+    # One polylines call for all points: a closed single-point polyline is drawn
+    # as a round cap, i.e. a filled dot of radius thickness / 2
+    points = np.asarray(landmarks, dtype=np.int32)[:, :2].reshape(-1, 1, 1, 2)
+    cv2.polylines(frame, list(points), True, color, max(2 * radius, 1))
 
 
 def draw_connections(frame: np.ndarray,
@@ -202,48 +457,109 @@ def draw_connections(frame: np.ndarray,
     Args:
         frame: Image frame to draw on
         landmarks: List of (x, y) landmark coordinates
-        connections: List of (start_idx, end_idx) pairs
+        connections: List (or set) of (start_idx, end_idx) pairs
         color: Line color in BGR
         thickness: Line thickness
     """
-    for connection in connections:
-        start_idx, end_idx = connection
-        if start_idx < len(landmarks) and end_idx < len(landmarks):
-            start_point = landmarks[start_idx]
-            end_point = landmarks[end_idx]
-            cv2.line(frame, start_point, end_point, color, thickness)
+    if len(landmarks) == 0:
+        return
+    
+    points = np.asarray(landmarks, dtype=np.int32)[:, :2]
+    pairs = _connection_pairs(connections)
+    
+    # Skip connections that refer to missing landmarks, then draw every
+    # segment in a single polylines call
+    segments = points[pairs[(pairs < len(points)).all(axis=1)]]
+    if len(segments):
+        cv2.polylines(frame, list(segments), False, color, thickness)
+
+
+def _connection_pairs(connections) -> np.ndarray:
+    """(K, 2) index array for a connection list, cached for hashable (frozenset) inputs"""
+    try:
+        return _connection_pairs_cached(connections)
+    except TypeError:
+        return np.asarray(list(connections), dtype=np.intp).reshape(-1, 2)
+
+
+@functools.lru_cache(maxsize=16)
+def _connection_pairs_cached(connections) -> np.ndarray:
+    return np.asarray(list(connections), dtype=np.intp).reshape(-1, 2)
 
 
 def preprocess_frame(frame: np.ndarray,
                      target_size: Optional[Tuple[int, int]] = None,
                      flip: bool = False,
-                     convert_rgb: bool = False) -> np.ndarray:
+                     convert_rgb: bool = False,
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Preprocess frame for vision processing
     
     Args:
-        frame: Input frame
+        frame: Input frame (never modified)
         target_size: Resize to (width, height) if provided
         flip: Flip horizontally
         convert_rgb: Convert BGR to RGB
+        out: Optional preallocated buffer for the result, reused across calls
     
     Returns:
-        Preprocessed frame
+        Preprocessed frame; the input frame itself when no operation is
+        requested, so copy it before drawing on it
     """
-    processed = frame.copy()
+    if not (flip or target_size or convert_rgb):
+        return frame
+    
+    # Only the last operation writes into out
+    processed = frame
     
     if flip:
-        processed = cv2.flip(processed, 1)
+        last = not (target_size or convert_rgb)
+        processed = cv2.flip(processed, 1, dst=out if last else None)
     
     if target_size:
-        processed = cv2.resize(processed, target_size)
+        last = not convert_rgb
+        processed = cv2.resize(processed, target_size, dst=out if last else None)
     
     if convert_rgb:
-        processed = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
+        processed = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB, dst=out)
     
     return processed
 
 
+def frame_signature(frame: np.ndarray, size: Tuple[int, int] = (32, 24)) -> np.ndarray:
+    """
+    Compute a tiny grayscale thumbnail used to detect scene changes
+    
+    Args:
+        frame: Input BGR frame
+        size: Thumbnail size as (width, height)
+    
+    Returns:
+        Thumbnail as int16 so signatures can be subtracted without overflow
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def frames_differ(signature1: Optional[np.ndarray],
+                  signature2: Optional[np.ndarray],
+                  threshold: float = 4.0) -> bool:
+    """
+    Compare two frame signatures
+    
+    Args:
+        signature1: Signature from frame_signature (or None)
+        signature2: Signature from frame_signature (or None)
+        threshold: Mean absolute gray-level difference counted as a change
+    
+    Returns:
+        True if the frames differ (or either signature is missing)
+    """
+    if signature1 is None or signature2 is None:
+        return True
+    return np.abs(signature1 - signature2).sum() > threshold * signature1.size
+
+
 def calculate_center(bbox: Tuple[int, int, int, int]) -> Tuple[int, int]:
     """
     Calculate center point of bounding box
@@ -272,7 +588,27 @@ def calculate_distance(point1: Tuple[int, int],
     Returns:
         Distance in pixels
     """
-    return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
+    return math.hypot(point1[0] - point2[0], point1[1] - point2[1])
+
+
+def calculate_distance_sq(point1: Tuple[int, int], 
+                          point2: Tuple[int, int]) -> int:
+    """
+    Calculate squared Euclidean distance between two points
+    
+    Cheaper than calculate_distance when only comparing against a threshold
+    (compare with threshold ** 2).
+    
+    Args:
+        point1: First point (x, y)
+        point2: Second point (x, y)
+    
+    Returns:
+        Squared distance in pixels
+    """
+    dx = point1[0] - point2[0]
+    dy = point1[1] - point2[1]
+    return dx * dx + dy * dy
 
 
 def estimate_depth_from_bbox(bbox_width: int, 
@@ -318,3 +654,395 @@ def add_overlay_text(frame: np.ndarray,
         y_pos = y + (i * line_spacing)
         cv2.putText(frame, line, (x, y_pos),
                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+
+
+def render_text_overlay(text_lines: List[str],
+                        font_scale: float = 0.6,
+                        color: Tuple[int, int, int] = (0, 255, 0),
+                        thickness: int = 2,
+                        line_spacing: int = 30) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    """
+    Rasterize overlay text once so it can be blitted onto later frames
+    
+    Args:
+        text_lines: List of text strings to display
+        font_scale: Font size scale
+        color: Text color in BGR (must not be black)
+        thickness: Text thickness
+        line_spacing: Pixels between lines
+    
+    Returns:
+        Tuple of (image, mask, offset); offset is the (dx, dy) of the image's
+        top-left corner relative to the first line's text position
+    """
+    width, ascent, descent = 1, 0, 0
+    for line in text_lines:
+        if line:
+            (w, h), baseline = get_text_size(line, font_scale, thickness)
+            width = max(width, w)
+            ascent = max(ascent, h)
+            descent = max(descent, baseline)
+    
+    pad = thickness
+    top = ascent + pad
+    height = top + max(len(text_lines) - 1, 0) * line_spacing + descent + pad
+    
+    image = np.zeros((height, width + 2 * pad, 3), np.uint8)
+    add_overlay_text(image, text_lines, position=(pad, top), font_scale=font_scale,
+                     color=color, thickness=thickness, line_spacing=line_spacing)
+    mask = image.any(axis=2)
+    
+    return image, mask, (-pad, -top)
+
+
+def blit_overlay(frame: np.ndarray,
+                 overlay: Tuple[np.ndarray, np.ndarray, Tuple[int, int]],
+                 position: Tuple[int, int]):
+    """
+    Copy a pre-rendered overlay (from render_text_overlay) onto a frame
+    
+    Args:
+        frame: Image frame to draw on
+        overlay: Tuple of (image, mask, offset) from render_text_overlay
+        position: Text position (x, y), as would be passed to add_overlay_text
+    """
+    image, mask, (dx, dy) = overlay
+    x, y = position[0] + dx, position[1] + dy
+    h, w = mask.shape
+    
+    # Clip against the frame edges
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, frame.shape[1]), min(y + h, frame.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    
+    np.copyto(frame[y0:y1, x0:x1], image[y0 - y:y1 - y, x0 - x:x1 - x],
+              where=mask[y0 - y:y1 - y, x0 - x:x1 - x, None])
+
+
+def encode_jpeg(frame: np.ndarray, quality: int = 85):
+    """
+    Encode a BGR frame as JPEG
+    
+    Uses simplejpeg (libjpeg-turbo SIMD DCT and color conversion) when it is
+    installed and falls back to cv2.imencode otherwise.
+    
+    Args:
+        frame: BGR frame
+        quality: JPEG quality (0-100)
+    
+    Returns:
+        JPEG data as a bytes-like object (bytes, or a memoryview over OpenCV's
+        output buffer so it isn't copied again), or None if encoding failed
+    """
+    if simplejpeg is not None:
+        return simplejpeg.encode_jpeg(frame, quality=quality, colorspace='BGR',
+                                      colorsubsampling='420', fastdct=True)
+    
+    ret, buffer = cv2.imencode('.jpg', frame, _jpeg_params(quality))
+    if not ret:
+        return None
+    return buffer.reshape(-1).data
+
+
+@functools.lru_cache(maxsize=16)
+def _jpeg_params(quality: int) -> Tuple[int, int]:
+    """imencode parameters for a quality, built once per value"""
+    return (cv2.IMWRITE_JPEG_QUALITY, quality)
+
+
+class OverlayCache:
+    """Keep pre-rendered overlays for recently drawn sets of text lines"""
+    
+    def __init__(self, font_scale: float = 0.6,
+                 color: Tuple[int, int, int] = (0, 255, 0),
+                 thickness: int = 2,
+                 line_spacing: int = 30,
+                 max_entries: int = 32):
+        """
+        Initialize overlay cache
+        
+        Args:
+            font_scale: Font size scale
+            color: Text color in BGR (must not be black)
+            thickness: Text thickness
+            line_spacing: Pixels between lines
+            max_entries: Least recently used overlays beyond this are dropped
+        """
+        self.font_scale = font_scale
+        self.color = color
+        self.thickness = thickness
+        self.line_spacing = line_spacing
+        self.max_entries = max_entries
+        self._overlays = OrderedDict()
+    
+    def render(self, lines: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+        """
+        Get the overlay for a tuple of lines, rasterizing it only on a miss
+        
+        Args:
+            lines: Text lines (must be hashable, so pass a tuple)
+        
+        Returns:
+            Overlay as returned by render_text_overlay
+        """
+        overlay = self._overlays.get(lines)
+        if overlay is not None:
+            self._overlays.move_to_end(lines)
+            return overlay
+        
+        overlay = render_text_overlay(list(lines), font_scale=self.font_scale, color=self.color,
+                                      thickness=self.thickness, line_spacing=self.line_spacing)
+        self._overlays[lines] = overlay
+        if len(self._overlays) > self.max_entries:
+            self._overlays.popitem(last=False)
+        return overlay
+    
+    def draw(self, frame: np.ndarray, lines: Tuple[str, ...], position: Tuple[int, int] = (10, 30)):
+        """
+        Draw lines on a frame from the cache
+        
+        Args:
+            frame: Image frame to draw on
+            lines: Text lines (must be hashable, so pass a tuple)
+            position: Starting position (x, y), as for add_overlay_text
+        """
+        blit_overlay(frame, self.render(lines), position)
+
+
+class FFmpegVideoWriter:
+    """
+    Encode BGR frames to H.264 with an ffmpeg subprocess
+    
+    Drop-in for cv2.VideoWriter (isOpened/write/release). Raw frames are piped
+    to ffmpeg's stdin, so encoding runs in a separate process, on the hardware
+    encoder (h264_v4l2m2m) where the Pi has one, or libx264 otherwise.
+    """
+    
+    ENCODERS = ('h264_v4l2m2m', 'libx264')
+    
+    # Probed encoder, shared by all writers (None until probed, '' if none works)
+    _encoder = None
+    
+    def __init__(self, filename: str, fps: Optional[float], frame_size: Tuple[int, int],
+                 bitrate: str = '2M', output_args: Sequence[str] = (),
+                 input_args: Sequence[str] = ()):
+        """
+        Start ffmpeg for the given output file
+        
+        Args:
+            filename: Output video filename, or '-' to read the encoded
+                stream from self.proc.stdout
+            fps: Frame rate written into the file (None: timestamps come
+                from input_args, e.g. -use_wallclock_as_timestamps)
+            frame_size: Frame size as (width, height)
+            bitrate: Target bitrate passed to ffmpeg's -b:v
+            output_args: Extra ffmpeg output options (e.g. '-f', 'mp4')
+            input_args: Extra ffmpeg options for the raw frame input
+        """
+        self.proc = None
+        self.frame_size = tuple(frame_size)
+        self.encoder = self.find_encoder()
+        if not self.encoder:
+            return
+        
+        width, height = frame_size
+        # An input -r overrides any other timestamps, so it is left out for fps=None
+        rate = ['-r', str(fps)] if fps is not None else []
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            *rate, *input_args, '-i', '-',
+            '-c:v', self.encoder, '-b:v', bitrate, '-pix_fmt', 'yuv420p',
+            *output_args, filename
+        ]
+        stdout = subprocess.PIPE if filename == '-' else None
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=stdout)
+        except OSError as e:
+            print(f"Warning: Failed to start ffmpeg: {e}")
+            self.proc = None
+    
+    @classmethod
+    def find_encoder(cls) -> str:
+        """
+        Find the first H.264 encoder that actually works on this machine
+        
+        Returns:
+            Encoder name, or '' if ffmpeg is missing or no encoder works
+        """
+        if cls._encoder is None:
+            cls._encoder = ''
+            if shutil.which('ffmpeg'):
+                for encoder in cls.ENCODERS:
+                    # Encode a few test frames; listing encoders is not enough since
+                    # h264_v4l2m2m is built in even on boards without the hardware
+                    probe = ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                             '-f', 'lavfi', '-i', 'color=size=64x64:duration=0.2',
+                             '-c:v', encoder, '-pix_fmt', 'yuv420p', '-f', 'null', '-']
+                    try:
+                        result = subprocess.run(probe, stdout=subprocess.DEVNULL,
+                                                stderr=subprocess.DEVNULL, timeout=10)
+                    except (OSError, subprocess.TimeoutExpired):
+                        continue
+                    if result.returncode == 0:
+                        cls._encoder = encoder
+                        break
+        return cls._encoder
+    
+    def isOpened(self) -> bool:
+        """Check whether ffmpeg is running and accepting frames"""
+        return self.proc is not None and self.proc.poll() is None
+    
+    def write(self, frame: np.ndarray):
+        """Send one BGR frame to the encoder (frames of the wrong size are skipped)"""
+        if self.proc is None:
+            return
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            return
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, ValueError):
+            print("Warning: ffmpeg exited, stopping video encoding")
+            self.release()
+    
+    def release(self):
+        """Flush remaining frames and wait for ffmpeg to finalize the file"""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
+
+
+class CudaVideoWriter:
+    """
+    Encode BGR frames to H.264 on an NVIDIA GPU (NVENC) with cv2.cudacodec
+    
+    Same interface as cv2.VideoWriter. Only usable on Jetson or desktop GPUs
+    with an OpenCV build that includes cudacodec; elsewhere isOpened() is False
+    and callers fall back to another writer.
+    """
+    
+    def __init__(self, filename: str, fps: float, frame_size: Tuple[int, int],
+                 bitrate: int = 2000000):
+        """
+        Open the GPU encoder
+        
+        Args:
+            filename: Output video filename
+            fps: Frame rate written into the file
+            frame_size: Frame size as (width, height)
+            bitrate: Average bitrate in bits/s
+        """
+        self.writer = None
+        self._gpu_frame = None
+        
+        cudacodec = getattr(cv2, 'cudacodec', None)
+        if cudacodec is None or not hasattr(cv2, 'cuda'):
+            return
+        
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() == 0:
+                return
+            
+            # Variable bitrate with one keyframe per second of output
+            params = cudacodec.EncoderParams()
+            params.rateControlMode = cudacodec.ENC_PARAMS_RC_VBR
+            params.averageBitRate = bitrate
+            params.gopLength = max(int(fps), 1)
+            
+            self.writer = cudacodec.createVideoWriter(
+                filename, tuple(frame_size), cudacodec.Codec_H264, fps,
+                cudacodec.ColorFormat_BGR, params
+            )
+            self._gpu_frame = cv2.cuda_GpuMat()
+        except (cv2.error, AttributeError) as e:
+            print(f"Warning: CUDA video writer unavailable: {e}")
+            self.writer = None
+    
+    def isOpened(self) -> bool:
+        """Check whether the GPU encoder is open"""
+        return self.writer is not None
+    
+    def write(self, frame: np.ndarray):
+        """Upload one BGR frame and encode it"""
+        if self.writer is None:
+            return
+        self._gpu_frame.upload(frame)
+        self.writer.write(self._gpu_frame)
+    
+    def release(self):
+        """Flush the encoder and close the file"""
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class ThreadedVideoWriter:
+    """
+    Run another video writer's write() calls on a background thread
+    
+    Wraps cv2.VideoWriter or FFmpegVideoWriter with the same interface. Frames
+    go through a small bounded queue; when the encoder falls behind, new frames
+    are dropped instead of stalling the caller's loop.
+    """
+    
+    def __init__(self, writer, max_queue: int = 8, copy: bool = True):
+        """
+        Start the writer thread
+        
+        Args:
+            writer: Opened writer to drive (anything with write/release/isOpened)
+            max_queue: Frames buffered before new ones are dropped
+            copy: Copy frames on write; pass False if the caller never reuses them
+        """
+        self.writer = writer
+        self.copy = copy
+        self.dropped_frames = 0
+        self.failed = False  # Set once the wrapped writer raised
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+    
+    def _writer_loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self.failed:
+                continue  # Keep draining so write() and release() never block
+            try:
+                self.writer.write(frame)
+            except Exception as e:
+                print(f"Warning: Video writer failed, dropping further frames: {e}")
+                self.failed = True
+    
+    def isOpened(self) -> bool:
+        """Check whether the wrapped writer is open"""
+        return self._thread is not None and not self.failed and self.writer.isOpened()
+    
+    def write(self, frame: np.ndarray):
+        """Queue a frame for encoding (dropped if the queue is full)"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(frame.copy() if self.copy else frame)
+        except queue.Full:
+            self.dropped_frames += 1
+    
+    def release(self):
+        """Write out queued frames, stop the thread and release the wrapped writer"""
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        if thread.is_alive():
+            try:
+                self._queue.put(None, timeout=5.0)
+                thread.join(timeout=10.0)
+            except queue.Full:
+                print("Warning: Video writer thread stuck, not waiting for it")
+        self.writer.release()
@@ -6,54 +6,120 @@ Live web-based camera viewer with vision processing
 Stream annotated video to web browser over network
 """
 
+import asyncio
 import cv2
 import time
 import argparse
-from flask import Flask, render_template, Response, request, jsonify
+from enum import IntEnum
+from quart import Quart, render_template, Response, request, jsonify
 from camera_controller import CameraController
 from face_recognition_module import FaceRecognitionModule
 from gesture_recognition_module import GestureRecognitionModule
 from object_3d_detection_module import Object3DDetectionModule
-from vision_utils import FPSCounter
+from vision_inference_pool import InferencePool
+from vision_utils import (FPSCounter, ThreadedVideoWriter, FFmpegVideoWriter,
+                          encode_jpeg, blit_overlay)
 import threading
+import uvicorn
 
 
-app = Flask(__name__)
+app = Quart(__name__)
+# The MJPEG stream is one endless response; don't let Quart time it out
+app.config['RESPONSE_TIMEOUT'] = None
 
 # Custom JSON encoder to handle numpy types
 import numpy as np
-from flask.json.provider import DefaultJSONProvider
+from quart.json.provider import DefaultJSONProvider
+
+# Optional: orjson serializes numpy scalars/arrays natively, in C
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class NumpyJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            return orjson.dumps(obj, default=self.default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+        return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+    
     def default(self, obj):
-        if isinstance(obj, (np.int_, np.intc, np.intp, np.int8,
-                            np.int16, np.int32, np.int64, np.uint8,
-                            np.uint16, np.uint32, np.uint64)):
+        # Only reached without orjson (or for types neither encoder knows)
+        if isinstance(obj, np.integer):
             return int(obj)
-        elif isinstance(obj, (np.float_, np.float16, np.float32, np.float64)):
+        elif isinstance(obj, np.floating):
             return float(obj)
-        elif isinstance(obj, (np.ndarray,)):
+        elif isinstance(obj, np.ndarray):
             return obj.tolist()
         return super().default(obj)
 
 app.json = NumpyJSONProvider(app)
 
+
+class Mode(IntEnum):
+    """Vision modes, indexing VisionWebStreamer._mode_handlers"""
+    FACE = 0
+    GESTURE = 1
+    OBJ3D = 2
+    ALL = 3
+    NONE = 4
+
+
+# Mode names as used by the API and the web page, in Mode order
+MODE_NAMES = ('face', 'gesture', '3d_object', 'all', 'none')
+
 # Global vision system instance
 vision_system = None
 
+# Codec for recordings
+_FOURCC_MP4V = cv2.VideoWriter_fourcc(*'mp4v')
+
+# Bytes read from ffmpeg per H.264 stream chunk
+_H264_CHUNK = 65536
+
+# Multipart part header for one MJPEG frame (% JPEG length)
+_FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+
 
 class VisionWebStreamer:
     """Web-based vision system streamer"""
     
-    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480):
-        """Initialize vision web streamer"""
+    # Stream JPEG quality range; it drops toward the minimum while encoding
+    # can't keep up with the camera and recovers once it can
+    MAX_JPEG_QUALITY = 85
+    MIN_JPEG_QUALITY = 55
+    
+    # API mode name -> Mode
+    _MODE_BY_NAME = {name: Mode(i) for i, name in enumerate(MODE_NAMES)}
+    
+    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480,
+                 backend: str = 'opencv', stream_width: int = None,
+                 multiprocess: bool = False):
+        """
+        Initialize vision web streamer
+        
+        Args:
+            camera_id: Camera device ID
+            width: Frame width (inference and recording)
+            height: Frame height (inference and recording)
+            backend: Camera backend ('opencv' or 'picamera2')
+            stream_width: Downscale the browser stream to this width (None = full size)
+            multiprocess: Run the detectors of 'all' mode in parallel worker processes
+        """
         
         print("Initializing camera...")
         self.camera = CameraController(
             camera_id=camera_id,
             width=width,
             height=height,
-            enable_servos=True
+            enable_servos=True,
+            backend=backend
         )
         self.camera.start_capture()
         
@@ -74,11 +140,32 @@ class VisionWebStreamer:
             enable_tracking=True
         )
         
+        # Detector processes for 'all' mode (which doesn't track, so the
+        # workers never need the camera)
+        self._pool = None
+        if multiprocess:
+            self._pool = InferencePool(
+                (height, width, 3),
+                {'face': {}, 'gesture': {}, '3d_object': {'object_type': 'Cup'}}
+            )
+        
         self.fps_counter = FPSCounter()
         
-        # Current mode
+        # Pre-rendered mode label / REC indicator, keyed by (mode, recording, width)
+        self._overlay_cache = {}
+        
+        # Current mode (name for the API, Mode for the inference loop)
         self.mode = 'face'
-        self.modes = ['face', 'gesture', '3d_object', 'all', 'none']
+        self._mode = Mode.FACE
+        self.modes = list(MODE_NAMES)
+        # Per-mode frame processing, indexed by Mode
+        self._mode_handlers = [
+            self._run_face,
+            self._run_gesture,
+            self._run_object_3d,
+            self._run_all if self._pool is None else self._run_all_pooled,
+            lambda frame: None  # NONE: just show raw camera
+        ]
         
         # Video recording
         self.recording = False
@@ -89,71 +176,381 @@ class VisionWebStreamer:
         self.frame_count = 0
         self.start_time = time.time()
         
+        # Processing pipeline shared by all clients, started by the first one:
+        # camera capture thread -> inference thread -> encoder thread -> latest_jpeg
+        self._pipeline_lock = threading.Lock()
+        self._pipeline_threads = []
+        self._pipeline_running = False
+        # Newest annotated frame and its sequence number, published by the
+        # inference thread (frames nobody picked up in time are simply replaced)
+        self._annotated = None
+        self._annot_seq = 0
+        self._annot_cond = threading.Condition()
+        self.latest_jpeg = (None, 0)  # (JPEG bytes or memoryview, sequence number)
+        self._jpeg_seq = 0
+        self._jpeg_lock = threading.Lock()
+        # Stream resolution; frames are downscaled into a fixed buffer before
+        # encoding, inference and recording keep the full-size frame
+        if stream_width and stream_width < width:
+            stream_height = round(height * stream_width / width) // 2 * 2
+            self.stream_size = (stream_width, stream_height)
+            self._stream_dst = np.empty((stream_height, stream_width, 3), np.uint8)
+        else:
+            self.stream_size = (width, height)
+            self._stream_dst = None
+        
+        # Adaptive stream JPEG quality (see _adapt_quality)
+        self.jpeg_quality = self.MAX_JPEG_QUALITY
+        self._encode_ms = 0.0  # EMA of encode time
+        self._encode_budget_ms = 1000.0 / self.camera.fps
+        self._skip_alternate = False
+        self._encodes_since_adapt = 0
+        # Serve camera-encoded JPEGs in 'none' mode while the camera can make them
+        self._camera_jpeg = True
+        # (event loop, asyncio.Event) per streaming client, set on each new JPEG
+        self._subscribers = set()
+        # Number of /video_feed.h264 clients (each has its own ffmpeg)
+        self._h264_clients = 0
+        # Set while anyone needs frames (a streaming client or a recording);
+        # the inference thread idles otherwise
+        self._demand = threading.Event()
+        
         print("Vision Web Streamer initialized!")
     
-    def generate_frames(self):
-        """Generate frames for MJPEG stream"""
+    def _start_pipeline(self):
+        """Start the inference and encoder threads (once, on the first client)"""
+        with self._pipeline_lock:
+            if self._pipeline_running:
+                return
+            
+            self._pipeline_running = True
+            self._pipeline_threads = [
+                threading.Thread(target=self._inference_loop, daemon=True),
+                threading.Thread(target=self._encoder_loop, daemon=True)
+            ]
+            for thread in self._pipeline_threads:
+                thread.start()
+    
+    def _stop_pipeline(self):
+        """Stop the pipeline threads and wait for them to finish"""
+        with self._pipeline_lock:
+            self._pipeline_running = False
+            for thread in self._pipeline_threads:
+                thread.join(timeout=2.0)
+            self._pipeline_threads = []
+    
+    def _run_face(self, frame):
+        self.face_module.process_frame(frame, recognize=True, track=True, draw=True)
+    
+    def _run_gesture(self, frame):
+        self.gesture_module.process_frame(frame, track=True, draw=True)
+    
+    def _run_object_3d(self, frame):
+        self.object_3d_module.process_frame(frame, track=True, draw=True)
+    
+    def _run_all(self, frame):
+        # Run all detectors (no tracking to avoid conflicts)
+        self.face_module.process_frame(frame, recognize=True, track=False, draw=True)
+        self.gesture_module.process_frame(frame, track=False, draw=True)
+        self.object_3d_module.process_frame(frame, track=False, draw=True)
+    
+    def _run_all_pooled(self, frame):
+        # Detect in the worker processes at once, then draw here
+        if frame.shape != self._pool.frame_shape:
+            self._run_all(frame)
+            return
+        detections = self._pool.detect(frame)
+        self.face_module.last_detections = detections['face']
+        self.face_module.draw_detections(frame, recognize=True)
+        self.gesture_module.last_detections = detections['gesture']
+        self.gesture_module.draw_detections(frame)
+        self.object_3d_module.last_detections = detections['3d_object']
+        self.object_3d_module.draw_detections(frame)
+    
+    def _inference_loop(self):
+        """Run the current mode on each new camera frame and queue it for encoding"""
+        # Bound methods looked up once instead of on every frame
+        camera = self.camera
+        wait_new = camera.wait_new
+        mode_handlers = self._mode_handlers
+        fps_update = self.fps_counter.update
+        draw_fps = self.fps_counter.draw_fps
+        status_overlay = self._status_overlay
+        annot_cond = self._annot_cond
         
-        while True:
-            ret, frame = self.camera.read()
-            if not ret or frame is None:
+        # Mode/REC overlay for the current state; re-fetched only when it changes
+        width = None  # Frame width, taken from the first frame
+        overlay_state = None
+        overlay = None
+        
+        last_count = 0
+        last_jpeg = 0
+        while self._pipeline_running:
+            if not self._demand.wait(timeout=1.0):
+                camera.stop_jpeg_stream()
+                continue
+            
+            mode = self._mode
+            
+            # Raw view: pass the camera's own JPEGs straight to the clients
+            # (no overlays, but nothing to draw or encode on the CPU either)
+            if (mode == Mode.NONE and not self.recording and not self._h264_clients
+                    and self._camera_jpeg):
+                if camera.start_jpeg_stream():
+                    last_jpeg, frame_bytes = camera.wait_jpeg(last_jpeg)
+                    if frame_bytes is not None:
+                        self.frame_count += 1
+                        fps_update()
+                        self._publish_jpeg(frame_bytes)
+                    continue
+                self._camera_jpeg = False
+            camera.stop_jpeg_stream()
+            
+            last_count, frame = wait_new(last_count)
+            if frame is None:
                 continue
             
             self.frame_count += 1
             
             # Process based on current mode
-            if self.mode == 'face':
-                self.face_module.process_frame(frame, recognize=True, track=True, draw=True)
-                
-            elif self.mode == 'gesture':
-                self.gesture_module.process_frame(frame, track=True, draw=True)
-                
-            elif self.mode == '3d_object':
-                self.object_3d_module.process_frame(frame, track=True, draw=True)
-                
-            elif self.mode == 'all':
-                # Run all detectors (no tracking to avoid conflicts)
-                self.face_module.process_frame(frame, recognize=True, track=False, draw=True)
-                self.gesture_module.process_frame(frame, track=False, draw=True)
-                self.object_3d_module.process_frame(frame, track=False, draw=True)
-            
-            # elif self.mode == 'none': just show raw camera
+            mode_handlers[mode](frame)
             
             # Add FPS counter
-            fps = self.fps_counter.update()
-            self.fps_counter.draw_fps(frame, fps)
+            draw_fps(frame, fps_update())
             
-            # Add mode label
-            cv2.putText(frame, f"Mode: {self.mode.upper()}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            # Add mode label and recording indicator
+            if width is None:
+                width = frame.shape[1]
+            state = (mode, self.recording)
+            if state != overlay_state:
+                overlay_state = state
+                overlay = status_overlay(mode, self.recording, width)
+            blit_overlay(frame, overlay, (0, 0))
             
-            # Add recording indicator
-            if self.recording:
-                cv2.circle(frame, (frame.shape[1] - 30, 30), 10, (0, 0, 255), -1)
-                cv2.putText(frame, "REC", (frame.shape[1] - 70, 38),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+            # Queue for the video file if recording (read once: stop_recording
+            # may clear it from a request thread at any time)
+            video_writer = self.video_writer
+            if self.recording and video_writer is not None:
+                video_writer.write(frame)
             
-            # Write to video file if recording
-            if self.recording and self.video_writer is not None:
-                self.video_writer.write(frame)
+            # Publish for the encoder; the frame is never touched again here
+            with annot_cond:
+                self._annotated = frame
+                self._annot_seq += 1
+                annot_cond.notify_all()
+    
+    def _status_overlay(self, mode: Mode, recording: bool, width: int):
+        """Get the mode label / REC indicator band for a state, rendering it once"""
+        key = (mode, recording, width)
+        overlay = self._overlay_cache.get(key)
+        if overlay is None:
+            image = np.zeros((45, width, 3), np.uint8)
+            cv2.putText(image, f"Mode: {MODE_NAMES[mode].upper()}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            if recording:
+                cv2.circle(image, (width - 30, 30), 10, (0, 0, 255), -1)
+                cv2.putText(image, "REC", (width - 70, 38),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+            overlay = self._overlay_cache[key] = (image, image.any(axis=2), (0, 0))
+        return overlay
+    
+    def _encoder_loop(self):
+        """Encode the newest annotated frame as JPEG and publish it to the clients"""
+        # Looked up once instead of on every frame
+        annot_cond = self._annot_cond
+        perf_counter = time.perf_counter
+        resize = cv2.resize
+        stream_size = self.stream_size
+        stream_dst = self._stream_dst
+        adapt_quality = self._adapt_quality
+        publish_jpeg = self._publish_jpeg
+        
+        last_annot = 0
+        skip = False
+        while self._pipeline_running:
+            with annot_cond:
+                if not annot_cond.wait_for(lambda: self._annot_seq != last_annot, timeout=1.0):
+                    continue
+                frame, last_annot = self._annotated, self._annot_seq
             
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if not ret:
+            # While over budget even at low quality, only encode every other frame
+            skip = self._skip_alternate and not skip
+            if skip:
                 continue
             
-            frame_bytes = buffer.tobytes()
+            start = perf_counter()
+            if stream_dst is not None:
+                frame = resize(frame, stream_size, dst=stream_dst, interpolation=cv2.INTER_AREA)
+            frame_bytes = encode_jpeg(frame, quality=self.jpeg_quality)
+            adapt_quality((perf_counter() - start) * 1000.0)
             
-            # Yield frame in MJPEG format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            if frame_bytes is not None:
+                publish_jpeg(frame_bytes)
+    
+    def _adapt_quality(self, encode_ms: float):
+        """Track encode time and step the JPEG quality to stay within the frame budget"""
+        self._encode_ms += 0.1 * (encode_ms - self._encode_ms)
+        
+        # Re-evaluate every 15 encodes so each step has time to show in the average
+        self._encodes_since_adapt += 1
+        if self._encodes_since_adapt < 15:
+            return
+        self._encodes_since_adapt = 0
+        
+        if self._encode_ms > self._encode_budget_ms:
+            if self.jpeg_quality > self.MIN_JPEG_QUALITY:
+                self.jpeg_quality = max(self.MIN_JPEG_QUALITY, self.jpeg_quality - 5)
+            else:
+                self._skip_alternate = True
+        elif self._encode_ms < 0.5 * self._encode_budget_ms:
+            if self._skip_alternate:
+                self._skip_alternate = False
+            elif self.jpeg_quality < self.MAX_JPEG_QUALITY:
+                self.jpeg_quality = min(self.MAX_JPEG_QUALITY, self.jpeg_quality + 5)
+    
+    def _publish_jpeg(self, frame_bytes):
+        """Make a JPEG the current stream frame and wake the streaming clients"""
+        with self._jpeg_lock:
+            self._jpeg_seq += 1
+            self.latest_jpeg = (frame_bytes, self._jpeg_seq)
+            for loop, new_jpeg in self._subscribers:
+                try:
+                    loop.call_soon_threadsafe(new_jpeg.set)
+                except RuntimeError:
+                    pass  # Event loop already closed (server shutting down)
+    
+    def _update_demand(self):
+        """Run the pipeline only while someone is watching or recording (hold _jpeg_lock)"""
+        if self._subscribers or self._h264_clients or self.recording:
+            self._demand.set()
+        else:
+            self._demand.clear()
+    
+    async def generate_frames(self):
+        """Generate frames for MJPEG stream"""
+        
+        self._start_pipeline()
+        
+        # Woken by the encoder thread; all clients share the same JPEG
+        new_jpeg = asyncio.Event()
+        subscriber = (asyncio.get_running_loop(), new_jpeg)
+        with self._jpeg_lock:
+            self._subscribers.add(subscriber)
+            self._update_demand()
+            if self.latest_jpeg[0] is not None:
+                new_jpeg.set()
+        
+        try:
+            last_seq = 0
+            while True:
+                await new_jpeg.wait()
+                new_jpeg.clear()
+                
+                frame_bytes, seq = self.latest_jpeg
+                if seq == last_seq:
+                    continue
+                last_seq = seq
+                
+                # Yield frame in MJPEG format (Content-Length lets clients
+                # read the JPEG without scanning for the boundary); join copies
+                # the JPEG exactly once, straight out of the encoder's buffer
+                yield b''.join((_FRAME_HEADER % len(frame_bytes), frame_bytes, b'\r\n'))
+        
+        finally:
+            # Client disconnected
+            with self._jpeg_lock:
+                self._subscribers.discard(subscriber)
+                self._update_demand()
+    
+    def open_h264_stream(self):
+        """
+        Start an ffmpeg process encoding the annotated frames to fragmented MP4
+        
+        Returns:
+            FFmpegVideoWriter whose proc.stdout yields the stream, or None if
+            no H.264 encoder works here
+        """
+        encoder = FFmpegVideoWriter.find_encoder()
+        if not encoder:
+            return None
+        
+        # Annotated frames arrive at the inference rate, not the camera's,
+        # so stamp each one with its arrival time and keep those timestamps
+        input_args = ['-use_wallclock_as_timestamps', '1']
+        # Fragments are cut at keyframes, so one per second (of stream time,
+        # whatever the frame rate) bounds the latency; empty_moov puts the
+        # init segment first so playback starts at once
+        output_args = ['-fps_mode', 'passthrough',
+                       '-force_key_frames', 'expr:gte(t,n_forced*1)', '-f', 'mp4',
+                       '-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+        if encoder == 'libx264':
+            # Software encoding (e.g. Pi 5, which has no H.264 hardware)
+            output_args[:0] = ['-preset', 'ultrafast', '-tune', 'zerolatency']
+        if self._stream_dst is not None:
+            output_args[:0] = ['-vf', 'scale=%d:%d' % self.stream_size]
+        
+        writer = FFmpegVideoWriter('-', None, (self.camera.width, self.camera.height),
+                                   bitrate='1500k', output_args=output_args,
+                                   input_args=input_args)
+        if not writer.isOpened():
+            return None
+        return writer
+    
+    def _feed_h264(self, writer, stop: threading.Event):
+        """Write each new annotated frame to a client's ffmpeg until it stops"""
+        annot_cond = self._annot_cond
+        last_annot = 0
+        while not stop.is_set() and writer.isOpened():
+            with annot_cond:
+                if not annot_cond.wait_for(lambda: self._annot_seq != last_annot, timeout=1.0):
+                    continue
+                frame, last_annot = self._annotated, self._annot_seq
             
-            time.sleep(0.03)  # ~30 FPS max
+            # Published frames are never modified again, so no copy is needed
+            writer.write(frame)
+    
+    @staticmethod
+    def _close_h264(writer, proc):
+        """Stop a client's ffmpeg without waiting for it to flush to nobody"""
+        proc.kill()
+        writer.release()  # No-op if the feed thread already saw ffmpeg exit
+        proc.stdout.close()
+    
+    async def generate_h264(self, writer):
+        """Generate the fragmented MP4 stream of one client's ffmpeg"""
+        
+        self._start_pipeline()
+        
+        with self._jpeg_lock:
+            self._h264_clients += 1
+            self._update_demand()
+        
+        # Kept here: writer.proc is cleared as soon as ffmpeg exits
+        proc = writer.proc
+        stdout = proc.stdout
+        stop = threading.Event()
+        threading.Thread(target=self._feed_h264, args=(writer, stop), daemon=True).start()
+        
+        try:
+            while True:
+                chunk = await asyncio.to_thread(stdout.read1, _H264_CHUNK)
+                if not chunk:
+                    break  # ffmpeg exited
+                yield chunk
+        
+        finally:
+            # Client disconnected
+            stop.set()
+            with self._jpeg_lock:
+                self._h264_clients -= 1
+                self._update_demand()
+            await asyncio.to_thread(self._close_h264, writer, proc)
     
     def set_mode(self, mode: str):
         """Change vision mode"""
-        if mode in self.modes:
+        if mode in self._MODE_BY_NAME:
             self.mode = mode
+            self._mode = self._MODE_BY_NAME[mode]
             print(f"Mode changed to: {mode}")
             return True
         return False
@@ -170,16 +567,22 @@ class VisionWebStreamer:
         self.video_filename = filename
         
         # Create video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         self.video_writer = cv2.VideoWriter(
             filename,
-            fourcc,
+            _FOURCC_MP4V,
             15.0,  # FPS
             (self.camera.width, self.camera.height)
         )
         
         if self.video_writer.isOpened():
+            # Encode and write on a background thread so a slow SD card can't
+            # stall the stream; the inference loop never touches a frame again
+            # after handing it over, so no copy is needed
+            self.video_writer = ThreadedVideoWriter(self.video_writer, max_queue=4, copy=False)
             self.recording = True
+            with self._jpeg_lock:
+                self._update_demand()
+            self._start_pipeline()
             print(f"Started recording to: {filename}")
             return True, f"Recording to {filename}"
         else:
@@ -192,9 +595,13 @@ class VisionWebStreamer:
             return False, "Not recording"
         
         self.recording = False
+        with self._jpeg_lock:
+            self._update_demand()
         if self.video_writer is not None:
-            self.video_writer.release()
-            self.video_writer = None
+            video_writer, self.video_writer = self.video_writer, None
+            video_writer.release()  # Writes out frames still queued
+            if video_writer.dropped_frames:
+                print(f"Recording dropped {video_writer.dropped_frames} frame(s) (writer too slow)")
         
         filename = self.video_filename
         self.video_filename = None
@@ -210,48 +617,64 @@ class VisionWebStreamer:
             'mode': self.mode,
             'recording': self.recording,
             'video_filename': self.video_filename,
-            'fps': float(self.fps_counter.get_fps()),
-            'frame_count': int(self.frame_count),
+            'fps': self.fps_counter.get_fps(),
+            'frame_count': self.frame_count,
+            'jpeg_quality': self.jpeg_quality,
+            'stream_resolution': list(self.stream_size),
             'uptime': int(time.time() - self.start_time),
-            'servo_pan': int(pan),
-            'servo_tilt': int(tilt),
+            'servo_pan': pan,
+            'servo_tilt': tilt,
             'detections': {
-                'faces': int(len(self.face_module.last_detections)),
-                'hands': int(len(self.gesture_module.last_detections)),
-                'objects_3d': int(len(self.object_3d_module.last_detections))
+                'faces': len(self.face_module.last_detections),
+                'hands': len(self.gesture_module.last_detections),
+                'objects_3d': len(self.object_3d_module.last_detections)
             }
         }
     
     def cleanup(self):
         """Cleanup resources"""
+        self._stop_pipeline()
+        
         if self.recording:
             self.stop_recording()
         
         self.face_module.close()
         self.gesture_module.close()
         self.object_3d_module.close()
+        if self._pool is not None:
+            self._pool.close()
         self.camera.close()
 
 
-# Flask routes
+# Routes (blocking calls into the vision system run in a worker thread
+# so they don't stall the event loop serving the streams)
 
 @app.route('/')
-def index():
+async def index():
     """Main page"""
-    return render_template('vision_viewer.html')
+    return await render_template('vision_viewer.html')
 
 
 @app.route('/video_feed')
-def video_feed():
+async def video_feed():
     """Video streaming route"""
     return Response(vision_system.generate_frames(),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+@app.route('/video_feed.h264')
+async def video_feed_h264():
+    """H.264 (fragmented MP4) streaming route, for a <video> element"""
+    writer = await asyncio.to_thread(vision_system.open_h264_stream)
+    if writer is None:
+        return jsonify({'success': False, 'error': 'No H.264 encoder available'}), 503
+    return Response(vision_system.generate_h264(writer), mimetype='video/mp4')
+
+
 @app.route('/api/mode', methods=['POST'])
-def set_mode():
+async def set_mode():
     """Change vision mode"""
-    data = request.json
+    data = await request.get_json()
     mode = data.get('mode')
     
     if vision_system.set_mode(mode):
@@ -261,67 +684,79 @@ def set_mode():
 
 
 @app.route('/api/recording/start', methods=['POST'])
-def start_recording():
+async def start_recording():
     """Start recording"""
-    success, message = vision_system.start_recording()
+    success, message = await asyncio.to_thread(vision_system.start_recording)
     return jsonify({'success': success, 'message': message})
 
 
 @app.route('/api/recording/stop', methods=['POST'])
-def stop_recording():
+async def stop_recording():
     """Stop recording"""
-    success, message = vision_system.stop_recording()
+    success, message = await asyncio.to_thread(vision_system.stop_recording)
     return jsonify({'success': success, 'message': message})
 
 
 @app.route('/api/servo/reset', methods=['POST'])
-def reset_servo():
+async def reset_servo():
     """Reset servo positions"""
-    vision_system.camera.reset_servos()
+    await asyncio.to_thread(vision_system.camera.reset_servos)
     return jsonify({'success': True})
 
 
 @app.route('/api/status')
-def get_status():
+async def get_status():
     """Get current status"""
     return jsonify(vision_system.get_status())
 
 
 @app.route('/api/face/add', methods=['POST'])
-def add_face():
+async def add_face():
     """Add a face to the database with a name"""
-    data = request.json
+    data = await request.get_json()
     name = data.get('name', '').strip()
     
     if not name:
         return jsonify({'success': False, 'error': 'Name is required'}), 400
     
+    error, face_id = await asyncio.to_thread(_add_face_from_camera, name)
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+    
+    if face_id:
+        return jsonify({
+            'success': True,
+            'message': f'Face added for {name}',
+            'face_id': face_id
+        })
+    else:
+        return jsonify({'success': False, 'error': 'Failed to add face'}), 500
+
+
+def _add_face_from_camera(name: str):
+    """
+    Detect a face in the current camera frame and add it to the database
+    
+    Returns:
+        Tuple of (error, face_id); error is (message, HTTP status) or None
+    """
     # Get current frame and detections
     ret, frame = vision_system.camera.read()
     if not ret or frame is None:
-        return jsonify({'success': False, 'error': 'Failed to capture frame'}), 500
+        return ('Failed to capture frame', 500), None
     
     # Detect faces in current frame
     faces = vision_system.face_module.detect_faces(frame)
     
     if len(faces) == 0:
-        return jsonify({'success': False, 'error': 'No face detected in frame'}), 400
+        return ('No face detected in frame', 400), None
     
     # Use the first detected face
     face = faces[0]
-    bbox = face['bbox']
+    bbox = face.bbox
     
     # Add face to database
-    face_id = vision_system.face_module.add_face(frame, bbox, name)
-    
-    if face_id:
-        return jsonify({
-            'success': True,
-            'message': f'Face added for {name}',
-            'face_id': face_id
-        })
-    else:
-        return jsonify({'success': False, 'error': 'Failed to add face'}), 500
+    return None, vision_system.face_module.add_face(frame, bbox, name)
 
 
 def main():
@@ -334,6 +769,12 @@ def main():
     parser.add_argument('--height', type=int, default=480, help='Frame height')
     parser.add_argument('--host', type=str, default='0.0.0.0', help='Server host')
     parser.add_argument('--port', type=int, default=5000, help='Server port')
+    parser.add_argument('--stream-width', type=int, default=None,
+                       help='Downscale the browser stream to this width (inference stays full size)')
+    parser.add_argument('--backend', type=str, default='opencv', choices=['opencv', 'picamera2'],
+                       help='Camera backend: opencv (USB camera) or picamera2 (CSI camera)')
+    parser.add_argument('--multiprocess', action='store_true',
+                       help="Run the detectors of 'all' mode in parallel processes")
     
     args = parser.parse_args()
     
@@ -341,7 +782,10 @@ def main():
     vision_system = VisionWebStreamer(
         camera_id=args.camera,
         width=args.width,
-        height=args.height
+        height=args.height,
+        backend=args.backend,
+        stream_width=args.stream_width,
+        multiprocess=args.multiprocess
     )
     
     print("\n" + "="*60)
@@ -357,8 +801,9 @@ def main():
     print("Press Ctrl+C to stop\n")
     
     try:
-        # Run Flask app
-        app.run(host=args.host, port=args.port, threaded=True, debug=False)
+        # Serve with Uvicorn: every stream and API call is a coroutine on one
+        # event loop (uvloop is picked up automatically when installed)
+        uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level='warning')
     except KeyboardInterrupt:
         print("\n\nShutting down...")
     finally:
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Vision Worker
+Long-lived headless vision process used by the Vision Control Center.
+
+The camera, vision modules and their imports are loaded once; sessions are
+then started by writing one JSON command per line to stdin:
+
+    {"op": "run", "mode": "face", "duration": 30, "save_video": false}
+    {"op": "stop"}    end the current session early
+    {"op": "quit"}    release the camera and exit
+
+SESSION_DONE is printed on its own line whenever a session ends.
+"""
+
+import json
+import queue
+import sys
+import threading
+
+# Marker line written to stdout when a session finishes
+SESSION_DONE = "@@vision-worker:session-done"
+
+
+def _read_commands(system, commands: queue.Queue):
+    """Parse stdin commands; 'stop' is applied immediately, others are queued"""
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            command = json.loads(line)
+        except ValueError:
+            print(f"Ignoring malformed command: {line}")
+            continue
+
+        op = command.get('op', 'run')
+        if op == 'stop':
+            system.stop()
+        elif op == 'quit':
+            system.stop()
+            commands.put(command)
+        else:
+            # Clear any earlier stop here, in order, so it can't cancel this session
+            system.stop_event.clear()
+            commands.put(command)
+
+    # stdin closed: the control center is gone
+    system.stop()
+    commands.put({'op': 'quit'})
+
+
+def main():
+    """Main entry point"""
+    from vision_system_headless import VisionSystemHeadless
+
+    system = VisionSystemHeadless()
+    commands = queue.Queue()
+    threading.Thread(target=_read_commands, args=(system, commands), daemon=True).start()
+
+    try:
+        while True:
+            command = commands.get()
+            if command.get('op') == 'quit':
+                break
+
+            system.mode = command.get('mode', 'face')
+            system.run(
+                duration=int(command.get('duration', 60)),
+                save_video=bool(command.get('save_video', False))
+            )
+            print(SESSION_DONE, flush=True)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        system.cleanup()
+
+
+if __name__ == "__main__":
+    main()